@@ -1,11 +1,19 @@
 from dotenv import load_dotenv
 import os
+import time
+import argparse
 from azure.ai.projects import AIProjectClient
 from azure.identity import DefaultAzureCredential
-from azure.ai.agents.models import ListSortOrder, FilePurpose
+from azure.ai.agents.models import (
+    AgentStreamEvent, ListSortOrder, FilePurpose, MessageDeltaChunk, ThreadMessage, ThreadRun
+)
 
 load_dotenv()
 
+parser = argparse.ArgumentParser(description="Chat with Doc Brown")
+parser.add_argument("--no-stream", action="store_true", help="wait for each run to finish instead of streaming it")
+args = parser.parse_args()
+
 project = AIProjectClient(
     endpoint=os.getenv("PROJECT_CONNECTION_STRING"),
     credential=DefaultAzureCredential(),
@@ -23,41 +31,125 @@ agent = project.agents.create_agent(
 
 thread = project.agents.threads.create()
 
+
+class TurnTimings:
+    """Wall-clock marks taken during one turn; each mark ends the step it names."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = {}
+
+    def mark(self, step):
+        self.marks.setdefault(step, time.perf_counter())
+
+    def report(self, run=None):
+        steps, previous = [], self.start
+        for step, at in sorted(self.marks.items(), key=lambda item: item[1]):
+            steps.append(f"{step} {at - previous:.2f}s")
+            previous = at
+        line = f"[turn {previous - self.start:.2f}s: {', '.join(steps)}"
+        if run is not None and run.usage:
+            line += f" | {run.usage.prompt_tokens} in / {run.usage.completion_tokens} out tokens"
+        return line + "]"
+
+
+def new_messages(thread_id, after_id):
+    """
+    Messages added to the thread after the message `after_id`, oldest first.
+
+    The thread is listed newest first and paging stops at the cursor, so a turn fetches only the
+    messages it added rather than the whole conversation.
+    """
+    newer = []
+    for message in project.agents.messages.list(thread_id=thread_id, order=ListSortOrder.DESCENDING, limit=20):
+        if message.id == after_id:
+            break
+        newer.append(message)
+    return newer[::-1]
+
+
+def stream_run(thread_id, timings):
+    """Run the agent and print its reply as it is generated. Returns (run, id of the last message it completed)."""
+    run, last_message_id, streaming = None, None, False
+    with project.agents.runs.stream(thread_id=thread_id, agent_id=agent.id) as stream:
+        for event_type, event_data, _ in stream:
+            if event_type == AgentStreamEvent.THREAD_RUN_IN_PROGRESS:
+                timings.mark("queued")
+            if isinstance(event_data, MessageDeltaChunk):
+                if not streaming:
+                    timings.mark("first token")
+                    print("Doc Brown: ", end="", flush=True)
+                    streaming = True
+                print(event_data.text, end="", flush=True)
+            elif isinstance(event_data, ThreadMessage) and event_data.status == "completed":
+                last_message_id = event_data.id
+            elif isinstance(event_data, ThreadRun):
+                run = event_data
+            elif event_type == AgentStreamEvent.ERROR:
+                print(f"Stream error: {event_data}")
+    if streaming:
+        print()
+        timings.mark("streaming")
+    timings.mark("wrap-up")
+    return run, last_message_id
+
+
+def process_run(thread_id, after_id, timings):
+    """Run the agent to completion, then print the messages it added. Returns (run, id of the last message)."""
+    run = project.agents.runs.create_and_process(thread_id=thread_id, agent_id=agent.id)
+    timings.mark("run")
+    if run.status == "failed":
+        return run, after_id
+
+    for message in new_messages(thread_id, after_id):
+        if message.run_id == run.id and message.text_messages:
+            print(f"Doc Brown: {message.text_messages[-1].text.value}")
+        after_id = message.id
+    timings.mark("fetch")
+    return run, after_id
+
+
 print("Chat with Doc Brown! (Press Enter with no input to exit)")
 print("-" * 50)
 
+# Id of the newest message already seen, so each turn only looks at messages after it
+cursor = None
+
 try:
     while True:
         # Prompt user for input
         user_input = input("\nYou: ").strip()
-        
+
         # If user presses enter with no input, exit
         if not user_input:
             break
-        
+
+        timings = TurnTimings()
+
         # Create message with user input
         message = project.agents.messages.create(
             thread_id=thread.id, 
-            role="user", 
+            role="user",
             content=user_input
         )
-        
+        cursor = message.id
+        timings.mark("post")
+
         # Run the agent
-        run = project.agents.runs.create_and_process(thread_id=thread.id, agent_id=agent.id)
-        
-        if run.status == "failed":
+        if args.no_stream:
+            run, cursor = process_run(thread.id, cursor, timings)
+        else:
+            run, last_message_id = stream_run(thread.id, timings)
+            cursor = last_message_id or cursor
+
+        if run is not None and run.status == "failed":
             print(f"Run failed: {run.last_error}")
-            continue
-        
-        # Get and display the agent's response
-        messages = project.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-        for message in messages:
-            if message.run_id == run.id and message.text_messages:
-                print(f"Doc Brown: {message.text_messages[-1].text.value}")
+
+        print(timings.report(run))
 
 except KeyboardInterrupt:
     print("\n\nExiting...")
 
 # Delete the agent once done
 project.agents.delete_agent(agent.id)
-print("Great Scott! The agent has been deleted. Goodbye!")
\ No newline at end of file
+print("Great Scott! The agent has been deleted. Goodbye!")
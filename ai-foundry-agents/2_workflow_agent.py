@@ -7,20 +7,29 @@ from collections.abc import Awaitable, Callable
 from contextlib import AsyncExitStack
 from typing import Any
 
-from agent_framework import AgentRunUpdateEvent, WorkflowBuilder, WorkflowOutputEvent
+from agent_framework import (AgentExecutorRequest, AgentRunUpdateEvent, ChatMessage, ExecutorCompletedEvent,
+                             ExecutorFailedEvent, ExecutorInvokedEvent, Role, UsageContent, WorkflowBuilder,
+                             WorkflowContext, WorkflowOutputEvent, executor)
 from agent_framework.azure import AzureAIAgentClient
 from azure.identity.aio import AzureCliCredential
-from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
-from azure.core.credentials import AzureKeyCredential
+from document_analysis import analyze_document, analyze_document_in_ranges, close_client
+from tracing import get_tracer
 
 load_dotenv()
 
-async def extract_text_from_pdf(filename: str) -> str:
+# Long PDFs can be analyzed as concurrent page-range requests (0 analyzes the whole file in one request)
+PAGES_PER_REQUEST = int(os.getenv("DOCUMENT_INTELLIGENCE_PAGES_PER_REQUEST", "0"))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("DOCUMENT_INTELLIGENCE_MAX_CONCURRENT_REQUESTS", "4"))
+
+async def extract_text_from_pdf(filename: str, pages_per_request: int = PAGES_PER_REQUEST,
+                                max_concurrency: int = MAX_CONCURRENT_REQUESTS) -> str:
     """
     Tool function to extract text from a PDF file using Azure Document Intelligence.
     
     Args:
         filename: Path to the PDF file to process
+        pages_per_request: When > 0, analyze this many pages per request, concurrently
+        max_concurrency: Maximum page-range requests in flight
         
     Returns:
         Extracted text content as a string
@@ -37,37 +46,25 @@ async def extract_text_from_pdf(filename: str) -> str:
         if not os.path.exists(filename):
             return f"Error: File '{filename}' not found"
         
-        # Read PDF file
-        with open(filename, "rb") as pdf_file:
-            pdf_bytes = pdf_file.read()
-        
-        # Create Document Intelligence client
-        credential = AzureKeyCredential(doc_intel_key)
-        async with DocumentIntelligenceClient(
-            endpoint=doc_intel_endpoint, 
-            credential=credential
-        ) as client:
-            
-            # Analyze document using the prebuilt-read model
-            poller = await client.begin_analyze_document(
-                model_id="prebuilt-read",
-                body=pdf_bytes,
-                content_type="application/octet-stream"
-            )
-            
-            # Wait for analysis to complete
-            result = await poller.result()
-            
-            # Extract text content
-            extracted_text = ""
-            if result.content:
-                extracted_text = result.content
-            else:
-                # Fallback: extract from paragraphs if content is not available
-                if result.paragraphs:
-                    extracted_text = "\n".join([paragraph.content for paragraph in result.paragraphs])
-            
-            return extracted_text if extracted_text else "No text found in the PDF"
+        # Analyze document using the prebuilt-read model with the shared client;
+        # a file that was already analyzed is returned from the cache
+        if pages_per_request > 0:
+            result = await analyze_document_in_ranges(filename, model_id="prebuilt-read",
+                                                      pages_per_request=pages_per_request,
+                                                      max_concurrency=max_concurrency)
+        else:
+            result = await analyze_document(filename, model_id="prebuilt-read")
+
+        # Extract text content
+        extracted_text = ""
+        if result.content:
+            extracted_text = result.content
+        else:
+            # Fallback: extract from paragraphs if content is not available
+            if result.paragraphs:
+                extracted_text = "\n".join([paragraph.content for paragraph in result.paragraphs])
+
+        return extracted_text if extracted_text else "No text found in the PDF"
             
     except Exception as e:
         return f"Error extracting text from PDF: {str(e)}"
@@ -95,29 +92,77 @@ async def create_azure_ai_agent() -> tuple[Callable[..., Awaitable[Any]], Callab
 
     return agent, close
 
-async def main(pdf_filename: str = None) -> None:
+async def read_pdf(filename: str, ctx: WorkflowContext[AgentExecutorRequest]) -> None:
+    """
+    Workflow node that extracts a PDF's text in plain Python and hands it straight to the Reviewer.
+
+    An agent in this position would read the text back as input tokens and then generate it all
+    again as output tokens just to pass it on; here the only LLM call per document is the review.
+    """
+    with get_tracer().span("PDF Reader", "executor"):
+        text = await extract_text_from_pdf(filename)
+    await ctx.send_message(AgentExecutorRequest(
+        messages=[ChatMessage(role=Role.USER, text=f"Review this resume:\n\n{text}")],
+        should_respond=True,
+    ))
+
+def build_workflow(resume_reviewer: Any):
+    # One workflow per document: each run gets its own executors and Reviewer conversation
+    pdf_reader = executor(id="PDF Reader")(read_pdf)
+    return (WorkflowBuilder()
+            .set_start_executor(pdf_reader)
+            .add_agent(resume_reviewer, output_response=True)
+            .add_edge(pdf_reader, resume_reviewer)
+            .build())
+
+async def review_pdf(resume_reviewer: Any, pdf_filename: str, stream: bool = True) -> Any:
+    """Run the workflow for one PDF, printing agent updates as they stream when `stream` is set. Returns the final output."""
+    tracer = get_tracer()
+    last_executor_id: str | None = None
+    output = None
+
+    with tracer.span("workflow", "pipeline", file=os.path.basename(pdf_filename)) as workflow_span:
+        # The agent executor runs inside the framework, so its span is opened and closed from the events
+        agent_span = None
+
+        events = build_workflow(resume_reviewer).run_stream(pdf_filename)
+        async for event in events:
+            if isinstance(event, ExecutorInvokedEvent) and event.executor_id == resume_reviewer.name:
+                agent_span = tracer.start_span(f"agent {event.executor_id}", "agent_run", parent=workflow_span)
+            elif isinstance(event, (ExecutorCompletedEvent, ExecutorFailedEvent)) and agent_span is not None \
+                    and event.executor_id == resume_reviewer.name:
+                error = RuntimeError(str(event.data)) if isinstance(event, ExecutorFailedEvent) else None
+                tracer.end_span(agent_span, error)
+                agent_span = None
+            elif isinstance(event, AgentRunUpdateEvent):
+                if agent_span is not None:
+                    for content in event.data.contents or []:
+                        if isinstance(content, UsageContent):
+                            agent_span.add_tokens(content.details.input_token_count, content.details.output_token_count)
+                    if event.data.text:
+                        agent_span.first_token()
+                if not stream:
+                    continue
+                # Handle streaming updates from agents
+                eid = event.executor_id
+                if eid != last_executor_id:
+                    if last_executor_id is not None:
+                        print()
+                    print(f"{eid}:", end=" ", flush=True)
+                    last_executor_id = eid
+                print(event.data, end="", flush=True)
+            elif isinstance(event, WorkflowOutputEvent):
+                output = event.data
+                if stream:
+                    print("\n===== Final output =====")
+                    print(event.data)
+        if agent_span is not None:
+            tracer.end_span(agent_span)
+    return output
+
+async def main(pdf_filenames: list[str], max_concurrency: int = 4) -> None:
     agent, close = await create_azure_ai_agent()
     try:
-        # Create tool for PDF text extraction
-        async def pdf_extraction_tool(filename: str) -> str:
-            """Extract text from a PDF file using Document Intelligence."""
-            return await extract_text_from_pdf(filename)
-
-        # Create a PDF Reader agent that can extract text from PDFs
-        # Note: Waiting for fix https://github.com/microsoft/agent-framework/pull/1769 to be 
-        # released for tool called form workflow agent to work correctly
-        # (fix merge was 10/30/25, latest version this date is 10/28/25 so should be soon)
-        pdf_reader = await agent(
-            name="PDF Reader",
-            instructions=(
-                "You are an excellent content writer. You have access to a tool that can extract text from PDF files. "
-                "When given a PDF filename, use the pdf_extraction_tool to extract the text content, "
-                "then pass that extracted text to the next agent for review and analysis."
-            ),
-            tools=[pdf_extraction_tool],
-            store=True
-        )
-
         # Create a Reviewer agent that provides feedback
         resume_reviewer = await agent(
             name="Reviewer",
@@ -129,40 +174,35 @@ async def main(pdf_filename: str = None) -> None:
             store=True
         )
 
-        # Build the workflow with agents as executors
-        workflow = WorkflowBuilder().set_start_executor(pdf_reader).add_edge(pdf_reader, resume_reviewer).build()
+        if len(pdf_filenames) == 1:
+            await review_pdf(resume_reviewer, pdf_filenames[0])
+            return
 
-        last_executor_id: str | None = None
+        # A batch: review documents concurrently and print each review as it completes,
+        # since interleaved token streams wouldn't be readable
+        slots = asyncio.Semaphore(max_concurrency)
 
-        input_message = f"Please extract text from the PDF file: {pdf_filename}, and review the content."
+        async def review(pdf_filename: str) -> None:
+            async with slots:
+                try:
+                    output = await review_pdf(resume_reviewer, pdf_filename, stream=False)
+                except Exception as e:
+                    output = f"Error: {e}"
+            print(f"\n===== {pdf_filename} =====")
+            print(output)
 
-        events = workflow.run_stream(input_message)
-        async for event in events:
-            if isinstance(event, AgentRunUpdateEvent):
-                # Handle streaming updates from agents
-                eid = event.executor_id
-                if eid != last_executor_id:
-                    if last_executor_id is not None:
-                        print()
-                    print(f"{eid}:", end=" ", flush=True)
-                    last_executor_id = eid
-                print(event.data, end="", flush=True)
-            elif isinstance(event, WorkflowOutputEvent):
-                print("\n===== Final output =====")
-                print(event.data)
+        await asyncio.gather(*(review(pdf_filename) for pdf_filename in pdf_filenames))
     finally:
         await close()
+        await close_client()
+        print()
+        print(get_tracer().summary())
 
 if __name__ == "__main__":
-    # Check if a PDF filename was provided as a command line argument
-    pdf_filename = sys.argv[1] if len(sys.argv) > 1 else None
+    # PDF filenames can be provided as command line arguments; several are reviewed concurrently
+    pdf_filenames = sys.argv[1:] or ["resume.pdf"]
+    max_concurrency = int(os.getenv("MAX_CONCURRENT_REVIEWS", "4"))
 
-    if pdf_filename is None:
-        pdf_filename = "resume.pdf"
-    
-    if pdf_filename:
-        print(f"Processing PDF file: {pdf_filename}")
-    else:
-        print("No PDF file provided. Running with default content generation.")
-    
-    asyncio.run(main(pdf_filename))
\ No newline at end of file
+    print(f"Processing PDF file{'s' if len(pdf_filenames) > 1 else ''}: {', '.join(pdf_filenames)}")
+
+    asyncio.run(main(pdf_filenames, max_concurrency))
\ No newline at end of file
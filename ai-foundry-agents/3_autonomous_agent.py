@@ -1,37 +1,49 @@
-import os, json, asyncio
-from typing import Dict, Any
+import os, sys, json, time, asyncio, argparse, glob
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
 from azure.identity.aio import AzureCliCredential
 
 # --- Agent Framework (Azure) ---
 from agent_framework.azure import AzureAIAgentClient  # Foundry-backed agents (threads/runs)
 
 # --- (Example) external SDKs / stubs ---
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import AnalyzeDocumentRequest
+# Shared, pooled Document Intelligence client with an on-disk result cache
+from document_analysis import analyze_document, close_client
+# Spans per pipeline, agent run, tool call and Document Intelligence poll, written to TRACE_FILE
+from tracing import get_tracer, traced
 
 # --------------------------
 # Tool implementations
 # --------------------------
 
+# Structured results of the tools called while processing the current invoice, keyed by stage.
+# Each pipeline sets its own dict, so concurrent invoices don't see each other's results
+_tool_outputs: ContextVar[Optional[Dict[str, Dict[str, Any]]]] = ContextVar("tool_outputs", default=None)
+
+def records_output(stage: str):
+    """Decorator: remember a tool's result for the router of the invoice being processed."""
+    def wrap(handler):
+        async def run(args: Dict[str, Any]) -> Dict[str, Any]:
+            result = await handler(args)
+            outputs = _tool_outputs.get()
+            if outputs is not None:
+                outputs[stage] = result
+            return result
+        run.__name__, run.__doc__ = handler.__name__, handler.__doc__
+        return run
+    return wrap
+
+@records_output("extract")
+@traced("tool", "tool extract_invoice")
 async def tool_extract_invoice(args: Dict[str, Any]) -> Dict[str, Any]:
     """Extract text/fields from a PDF using Azure Document Intelligence."""
     filename = args.get("filename")
     if not filename or not os.path.exists(filename):
         return {"ok": False, "error": f"file not found: {filename}"}
 
-    endpoint = os.environ["DOCUMENT_INTELLIGENCE_ENDPOINT"]
-    key = os.environ["DOCUMENT_INTELLIGENCE_KEY"]
-    client = DocumentIntelligenceClient(endpoint=endpoint, credential=AzureKeyCredential(key))
-
-    # Use prebuilt-document to keep sample simple; swap to prebuilt-invoice if you prefer
-    with open(filename, "rb") as f:
-        pdf = f.read()
-    poller = await client.begin_analyze_document(
-        model_id="prebuilt-invoice",
-        analyze_request=AnalyzeDocumentRequest(bytes_source=pdf)
-    )
-    result = await poller.result()
+    # The same invoice bytes are only analyzed once; retries and re-runs come from the cache
+    result = await analyze_document(filename, model_id="prebuilt-invoice")
 
     # Minimal mapping for demo
     out = {
@@ -49,6 +61,8 @@ _FAKE_PO = {
     "PO-1002": {"vendor": "Fabrikam Inc", "amount": 980.75, "status": "Open"},
 }
 
+@records_output("validate")
+@traced("tool", "tool validate_against_po")
 async def tool_validate_against_po(args: Dict[str, Any]) -> Dict[str, Any]:
     po = args.get("po")
     total = float(args.get("total") or 0)
@@ -63,6 +77,8 @@ async def tool_validate_against_po(args: Dict[str, Any]) -> Dict[str, Any]:
         deltas["vendor_mismatch"] = {"po_vendor": po_row["vendor"], "inv_vendor": vendor}
     return {"ok": len(deltas) == 0, "delta": deltas}
 
+@records_output("post")
+@traced("tool", "tool post_to_erp")
 async def tool_post_to_erp(args: Dict[str, Any]) -> Dict[str, Any]:
     # pretend to post; return a voucher id
     return {"ok": True, "voucher_id": f"VCHR-{args.get('invoice_id','NA')}-001"}
@@ -130,19 +146,8 @@ AGENT_SYSTEMS = {
     ),
 }
 
-async def main():
-    cred = AzureCliCredential()
-
-    client = AzureAIAgentClient(
-        credential=cred,
-        project_endpoint=os.environ["AZURE_AI_PROJECT_ENDPOINT"],
-        model_deployment_name=os.environ["AZURE_AI_MODEL_DEPLOYMENT_NAME"],
-    )
-
-    # Create or attach to a single Foundry thread so all agents share state
-    thread = await client.threads.create()
-    print("Thread:", thread.id)
-
+async def create_agents(client) -> Dict[str, Any]:
+    """Create the four agents once; every invoice pipeline reuses them."""
     # Create four agents (Foundry-backed). Toolsets are bound per agent.
     orchestrator = await client.agents.create(
         name="orchestrator",
@@ -164,44 +169,214 @@ async def main():
         instructions=AGENT_SYSTEMS["poster"],
         toolset=[POST_TOOL],
     )
+    return {"orchestrator": orchestrator, "extractor": extractor, "validator": validator, "poster": poster}
 
-    # Seed the thread with a goal
-    await client.messages.create(
-        thread_id=thread.id,
-        role="user",
-        content="Goal: Process invoice ./samples/invoices/contoso_invoice.pdf end-to-end."
-    )
+# --------------------------
+# Pipeline
+# --------------------------
+
+class StageTimings:
+    """Collects the latency of every agent run by stage (agent name) across all pipelines."""
+
+    def __init__(self):
+        self.seconds: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.seconds[stage].append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for stage, values in self.seconds.items():
+            values = sorted(values)
+            out[stage] = {
+                "runs": len(values),
+                "mean_s": round(sum(values) / len(values), 2),
+                "p50_s": round(values[len(values) // 2], 2),
+                "p95_s": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+            }
+        return out
+
+def next_step(outputs: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """
+    Deterministic router: pick the next agent from the structured tool outputs so far.
+
+    Returns an agent name, "done" once a voucher has been posted, or None when the state is
+    failed or ambiguous (extraction failed, validation found deltas, posting failed) and the
+    orchestrator should decide.
+    """
+    extract, validate, post = outputs.get("extract"), outputs.get("validate"), outputs.get("post")
+    if post is not None:
+        return "done" if post.get("ok") and post.get("voucher_id") else None
+    if validate is not None:
+        return "poster" if validate.get("ok") and not validate.get("delta") else None
+    if extract is not None:
+        return "validator" if extract.get("ok") else None
+    return "extractor"
+
+class Pipeline:
+    """
+    Runs the autonomous invoice loop for any number of invoices over one client and one set of agents.
+
+    Each invoice gets its own thread (so pipelines don't see each other's messages), while
+    `max_active_runs` bounds how many runs of each agent are in flight at once across all of them.
+    """
+
+    def __init__(self, client, agents: Dict[str, Any], max_active_runs: int = 4):
+        self.client = client
+        self.agents = agents
+        self.limits = {name: asyncio.Semaphore(max_active_runs) for name in agents}
+        self.timings = StageTimings()
+        # Router metrics: every routed step is an orchestrator call avoided
+        self.router = {"routed_steps": 0, "orchestrator_calls": 0, "nudges": 0}
+
+    async def run_agent(self, thread_id: str, name: str):
+        waiting = time.perf_counter()
+        async with self.limits[name]:
+            started = time.perf_counter()
+            with get_tracer().span(f"agent {name}", "agent_run", queued_s=round(started - waiting, 4)) as span:
+                try:
+                    run = await self.client.runs.create_and_process(thread_id=thread_id, agent_id=self.agents[name].id)
+                finally:
+                    self.timings.record(name, time.perf_counter() - started)
+                usage = getattr(run, "usage", None)
+                if usage is not None:
+                    span.add_tokens(getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0))
+                span.attributes["status"] = str(getattr(run, "status", ""))
+                return run
+
+    async def process(self, filename: str) -> str:
+        """Take one invoice from zero to posted; returns the thread id."""
+        with get_tracer().span("invoice", "pipeline", file=os.path.basename(filename)):
+            return await self._process(filename)
 
-    # --- Autonomous loop (orchestrator decides the next agent) ---
-    # In a production app you might add guards/timeouts; this is a small demo loop.
-    for _ in range(8):
-        # Let orchestrator think about the next step based on the thread so far
-        orch_run = await client.runs.create_and_process(thread_id=thread.id, 
-                                                        agent_id=orchestrator.id)
-
-        # Pull the latest assistant message to decide whom to call next (simple heuristic)
-        messages = await client.messages.list(thread_id=thread.id, limit=1)
-        last = messages.data[0].content[0].text if messages.data else ""
-        text = last.strip().lower()
-
-        if "extract" in text or "extractor" in text:
-            await client.runs.create_and_process(thread_id=thread.id, agent_id=extractor.id)
-        elif "validate" in text or "validator" in text:
-            await client.runs.create_and_process(thread_id=thread.id, agent_id=validator.id)
-        elif "post" in text or "poster" in text or "ready_to_post" in text:
-            await client.runs.create_and_process(thread_id=thread.id, agent_id=poster.id)
-            break
-        else:
-            # If the orchestrator didn’t specify, nudge it
-            await client.messages.create(thread_id=thread.id, role="user",
-                                         content="Which agent should run next: extractor, validator, or poster? Reply with one word.")
-    # Show final thread transcript
-    final_messages = await client.messages.list(thread_id=thread.id, limit=50)
+    async def _process(self, filename: str) -> str:
+        client = self.client
+
+        # Create a Foundry thread for this invoice so its agents share state
+        thread = await client.threads.create()
+
+        # Seed the thread with a goal
+        await client.messages.create(
+            thread_id=thread.id,
+            role="user",
+            content=f"Goal: Process invoice {filename} end-to-end."
+        )
+
+        # Tools record their results here while this invoice's agents run
+        outputs: Dict[str, Dict[str, Any]] = {}
+        _tool_outputs.set(outputs)
+        last_routed = None
+
+        # --- Autonomous loop (tool outputs decide the next agent; orchestrator on failures) ---
+        for _ in range(8):
+            step = next_step(outputs)
+            if step == "done":
+                break
+
+            # Happy path: no LLM call needed to decide. If the routed agent ran but didn't
+            # call its tool, the state is ambiguous and the orchestrator takes over
+            if step is not None and step != last_routed:
+                last_routed = step
+                self.router["routed_steps"] += 1
+                await self.run_agent(thread.id, step)
+                continue
+            last_routed = None
+
+            # Let orchestrator think about the next step based on the thread so far
+            self.router["orchestrator_calls"] += 1
+            await self.run_agent(thread.id, "orchestrator")
+
+            # Pull the latest assistant message to decide whom to call next (simple heuristic)
+            messages = await client.messages.list(thread_id=thread.id, limit=1)
+            last = messages.data[0].content[0].text if messages.data else ""
+            text = last.strip().lower()
+
+            if "extract" in text or "extractor" in text:
+                await self.run_agent(thread.id, "extractor")
+            elif "validate" in text or "validator" in text:
+                await self.run_agent(thread.id, "validator")
+            elif "post" in text or "poster" in text or "ready_to_post" in text:
+                await self.run_agent(thread.id, "poster")
+                break
+            else:
+                # If the orchestrator didn’t specify, nudge it
+                self.router["nudges"] += 1
+                await client.messages.create(thread_id=thread.id, role="user",
+                                             content="Which agent should run next: extractor, validator, or poster? Reply with one word.")
+        return thread.id
+
+async def print_transcript(client, thread_id: str) -> None:
+    final_messages = await client.messages.list(thread_id=thread_id, limit=50)
     print("\n=== Transcript ===")
     for m in reversed(final_messages.data):
         role = m.role
         text = (m.content[0].text if m.content else "").strip()
         print(f"[{role}] {text[:300]}")
 
+async def run_batch(pipeline: Pipeline, filenames: List[str], timeout: float, max_invoices: int) -> None:
+    """Process many invoices concurrently, each with its own timeout, then report throughput and stage latency."""
+    in_flight = asyncio.Semaphore(max_invoices)
+    results = {"completed": 0, "timeout": 0, "failed": 0}
+
+    async def one(filename: str) -> None:
+        async with in_flight:
+            try:
+                thread_id = await asyncio.wait_for(pipeline.process(filename), timeout=timeout)
+                results["completed"] += 1
+                print(f"{filename}: done (thread {thread_id})", flush=True)
+            except asyncio.TimeoutError:
+                results["timeout"] += 1
+                print(f"{filename}: timed out after {timeout:.0f}s", file=sys.stderr, flush=True)
+            except Exception as e:
+                results["failed"] += 1
+                print(f"{filename}: failed: {e}", file=sys.stderr, flush=True)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(f) for f in filenames))
+    elapsed = time.perf_counter() - started
+
+    print("\n=== Batch summary ===")
+    print(f"{len(filenames)} invoices in {elapsed:.1f}s ({len(filenames) / elapsed * 60:.1f} invoices/minute): {results}")
+    for stage, stats in pipeline.timings.summary().items():
+        print(f"  {stage:<12} {stats}")
+    print(f"Router: {pipeline.router['routed_steps']} orchestrator calls avoided, "
+          f"{pipeline.router['orchestrator_calls']} made, {pipeline.router['nudges']} nudges")
+
+async def main(batch_folder: str = None, max_active_runs: int = 4, timeout: float = 300, max_invoices: int = 16):
+    cred = AzureCliCredential()
+
+    client = AzureAIAgentClient(
+        credential=cred,
+        project_endpoint=os.environ["AZURE_AI_PROJECT_ENDPOINT"],
+        model_deployment_name=os.environ["AZURE_AI_MODEL_DEPLOYMENT_NAME"],
+    )
+
+    agents = await create_agents(client)
+    pipeline = Pipeline(client, agents, max_active_runs=max_active_runs)
+
+    try:
+        if batch_folder:
+            filenames = sorted(glob.glob(os.path.join(batch_folder, "*.pdf")))
+            await run_batch(pipeline, filenames, timeout=timeout, max_invoices=max_invoices)
+            return
+
+        thread_id = await pipeline.process("./samples/invoices/contoso_invoice.pdf")
+        print("Thread:", thread_id)
+        print("Router:", pipeline.router)
+
+        # Show final thread transcript
+        await print_transcript(client, thread_id)
+    finally:
+        await close_client()
+        print()
+        print(get_tracer().summary())
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Autonomous invoice processing with four cooperating agents")
+    parser.add_argument("--batch", metavar="FOLDER", help="process every PDF invoice in a folder concurrently")
+    parser.add_argument("--max-active-runs", type=int, default=4, help="concurrent runs allowed per agent")
+    parser.add_argument("--max-invoices", type=int, default=16, help="invoices in flight at once in batch mode")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed per invoice in batch mode")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.batch, args.max_active_runs, args.timeout, args.max_invoices))
@@ -0,0 +1,329 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
+from azure.ai.documentintelligence.models import AnalyzeResult
+from azure.core.credentials import AzureKeyCredential
+
+from tracing import get_tracer
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    # Without pypdf the page count is unknown, so documents are analyzed in one request
+    PdfReader = PdfWriter = None
+
+# --------------------------
+# Shared client
+# --------------------------
+
+# One client per event loop: its transport keeps a pool of keep-alive connections, so every
+# analysis after the first skips the TCP/TLS handshake. Async clients can't cross event loops.
+_clients: Dict[asyncio.AbstractEventLoop, DocumentIntelligenceClient] = {}
+
+
+def get_client(endpoint: Optional[str] = None, key: Optional[str] = None) -> DocumentIntelligenceClient:
+    """
+    Return the process-wide Document Intelligence client for the running event loop.
+
+    Endpoint and key default to DOCUMENT_INTELLIGENCE_ENDPOINT / DOCUMENT_INTELLIGENCE_KEY, so
+    pointing the endpoint at a local mock of the analyze and poll routes is enough to test without Azure.
+    Callers must not close the client; call `close_client()` once at shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = DocumentIntelligenceClient(
+            endpoint=endpoint or os.environ["DOCUMENT_INTELLIGENCE_ENDPOINT"],
+            credential=AzureKeyCredential(key or os.environ["DOCUMENT_INTELLIGENCE_KEY"]),
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_client() -> None:
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+# --------------------------
+# Result cache
+# --------------------------
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AnalyzeResultCache:
+    """
+    On-disk cache of `AnalyzeResult`s keyed by (model id, page range, SHA-256 of the file).
+
+    The key depends only on the bytes, so retries, re-runs and the same invoice uploaded under
+    another name return instantly without a new analyze/poll round-trip. Entries are JSON files
+    written atomically, so concurrent processes can share the directory.
+    """
+
+    def __init__(self, directory: str = ".analyze_cache"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, model_id: str, digest: str, pages: Optional[str]) -> str:
+        suffix = f"-{pages.replace(',', '_')}" if pages else ""
+        return os.path.join(self.directory, f"{model_id}-{digest}{suffix}.json")
+
+    def get(self, model_id: str, digest: str, pages: Optional[str] = None) -> Optional[AnalyzeResult]:
+        path = self._path(model_id, digest, pages)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return AnalyzeResult(json.load(f))
+
+    def put(self, model_id: str, digest: str, result: AnalyzeResult, pages: Optional[str] = None) -> None:
+        path = self._path(model_id, digest, pages)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result.as_dict(), f)
+        os.replace(tmp_path, path)
+
+
+_cache: Optional[AnalyzeResultCache] = None
+# Analyses in progress, so concurrent requests for the same file share one call
+_in_flight: Dict[str, "asyncio.Task[AnalyzeResult]"] = {}
+
+
+def get_cache() -> AnalyzeResultCache:
+    global _cache
+    if _cache is None:
+        _cache = AnalyzeResultCache(os.getenv("DOCUMENT_INTELLIGENCE_CACHE_DIR", ".analyze_cache"))
+    return _cache
+
+# --------------------------
+# Analysis
+# --------------------------
+
+async def analyze_document(filename: str, model_id: str = "prebuilt-read", pages: Optional[str] = None,
+                           use_cache: bool = True) -> AnalyzeResult:
+    """
+    Analyze a file with the shared client, returning a cached result when the same bytes were analyzed before.
+
+    Args:
+        filename: Path to the PDF (or image) on disk
+        model_id: Document Intelligence model, e.g. "prebuilt-read" or "prebuilt-invoice"
+        pages: Optional 1-based page range to analyze, e.g. "1-50"
+        use_cache: Set to False to always call the service (the result is still stored)
+
+    Returns:
+        The `AnalyzeResult` of the analysis
+    """
+    with get_tracer().span(f"analyze {model_id}", "di_poll", file=os.path.basename(filename), pages=pages) as span:
+        digest = await asyncio.to_thread(file_hash, filename)
+        cache = get_cache()
+        if use_cache:
+            cached = await asyncio.to_thread(cache.get, model_id, digest, pages)
+            if cached is not None:
+                span.attributes["cache_hit"] = True
+                return cached
+
+        return await _shared(span, f"{model_id}|{digest}|{pages}",
+                             lambda: _analyze(filename, model_id, pages, digest, cache))
+
+
+async def _shared(span, key: str, analyze) -> AnalyzeResult:
+    """Await the analysis in flight for `key`, starting it with `analyze()` if there is none."""
+    task = _in_flight.get(key)
+    if task is not None:
+        span.attributes["shared"] = True
+    else:
+        # The analysis runs as its own task and every caller waits through a shield, so cancelling
+        # one caller (even the one that started it) never cancels it for the others. If every
+        # caller goes away, the analysis still finishes and its result is cached for the next one.
+        task = asyncio.create_task(analyze())
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+        _in_flight[key] = task
+    return await asyncio.shield(task)
+
+
+async def _analyze(filename: str, model_id: str, pages: Optional[str], digest: str,
+                   cache: AnalyzeResultCache, body: Optional[bytes] = None,
+                   cache_pages: Optional[str] = None) -> AnalyzeResult:
+    """
+    Submit one analysis, poll it to completion and cache the result.
+
+    The file is streamed from disk unless `body` holds the bytes to upload instead (a page range
+    split out of it); the result is then cached under `cache_pages` rather than `pages`.
+    """
+    with get_tracer().span("analyze request", "di_poll") as span:
+        # Called for every HTTP attempt (the retry policy runs before the hook), so extra POSTs are retries
+        requests = {"POST": 0, "GET": 0}
+        def count_request(response) -> None:
+            method = response.http_request.method
+            requests[method] = requests.get(method, 0) + 1
+
+        try:
+            # Stream the file to the service instead of reading it into memory first (a range split
+            # out of it is already in memory)
+            with (io.BytesIO(body) if body is not None else open(filename, "rb")) as f:
+                poller = await get_client().begin_analyze_document(
+                    model_id=model_id,
+                    body=f,
+                    pages=pages,
+                    content_type="application/octet-stream",
+                    raw_response_hook=count_request,
+                )
+                span.attributes["submit_s"] = round(span.duration_s, 4)
+                result = await poller.result()
+            await asyncio.to_thread(cache.put, model_id, digest, result, cache_pages or pages)
+            return result
+        finally:
+            span.retries = max(0, requests["POST"] - 1)
+            if requests.get("GET"):
+                span.attributes["polls"] = requests["GET"]
+
+
+# --------------------------
+# Page-range analysis
+# --------------------------
+
+def page_count(filename: str) -> Optional[int]:
+    if PdfReader is None or not filename.lower().endswith(".pdf"):
+        return None
+    with open(filename, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+def extract_pages(filename: str, first: int, last: int) -> bytes:
+    """A PDF of the 1-based pages first..last of `filename`, built in memory."""
+    with open(filename, "rb") as f:
+        reader = PdfReader(f)
+        writer = PdfWriter()
+        for number in range(first - 1, last):
+            writer.add_page(reader.pages[number])
+        out = io.BytesIO()
+        writer.write(out)
+    return out.getvalue()
+
+
+async def analyze_page_range(filename: str, first: int, last: int, model_id: str = "prebuilt-read",
+                             digest: Optional[str] = None, use_cache: bool = True) -> AnalyzeResult:
+    """
+    Analyze pages first..last (1-based) of a PDF, uploading only those pages.
+
+    The range is copied into a PDF of its own, so each request sends its share of the file rather
+    than all of it. Page numbers in the result are therefore relative to the range (starting at 1);
+    `stitch_results` makes them absolute again. Results are cached under the whole file's digest
+    (pass `digest` to avoid hashing the file once per range) and a "split-first-last" page key.
+    """
+    pages = f"{first}-{last}"
+    with get_tracer().span(f"analyze {model_id}", "di_poll", file=os.path.basename(filename), pages=pages) as span:
+        digest = digest or await asyncio.to_thread(file_hash, filename)
+        cache = get_cache()
+        cache_pages = f"split-{pages}"
+        if use_cache:
+            cached = await asyncio.to_thread(cache.get, model_id, digest, cache_pages)
+            if cached is not None:
+                span.attributes["cache_hit"] = True
+                return cached
+
+        async def analyze() -> AnalyzeResult:
+            body = await asyncio.to_thread(extract_pages, filename, first, last)
+            return await _analyze(filename, model_id, None, digest, cache, body=body, cache_pages=cache_pages)
+
+        return await _shared(span, f"{model_id}|{digest}|{cache_pages}", analyze)
+
+
+def _shift_offsets(node: Any, delta: int) -> None:
+    """Move every span (a dict with `offset` and `length`) in an analyze result dict by `delta` characters."""
+    if isinstance(node, dict):
+        if "offset" in node and "length" in node:
+            node["offset"] += delta
+        for value in node.values():
+            _shift_offsets(value, delta)
+    elif isinstance(node, list):
+        for value in node:
+            _shift_offsets(value, delta)
+
+
+def _shift_page_numbers(node: Any, delta: int) -> None:
+    """Add `delta` to every `pageNumber` (pages and bounding regions) in an analyze result dict."""
+    if isinstance(node, dict):
+        if isinstance(node.get("pageNumber"), int):
+            node["pageNumber"] += delta
+        for value in node.values():
+            _shift_page_numbers(value, delta)
+    elif isinstance(node, list):
+        for value in node:
+            _shift_page_numbers(value, delta)
+
+
+def stitch_results(results: List[AnalyzeResult], separator: str = "\n",
+                   first_pages: Optional[List[int]] = None) -> AnalyzeResult:
+    """
+    Combine the results of consecutive page ranges into one result, as if the document was analyzed at once.
+
+    Content is joined in page order and every span offset of a later range is moved past the
+    content before it, so paragraph/line/word offsets still index into the combined `content`.
+    When the ranges were analyzed as separate PDFs, `first_pages` holds each range's first page
+    (1-based) and page numbers are moved by first page - 1, so they number pages of the whole file.
+    """
+    combined: Dict[str, Any] = {}
+    content = ""
+    for index, result in enumerate(results):
+        part = result.as_dict()
+        if first_pages:
+            _shift_page_numbers(part, first_pages[index] - 1)
+        if content and part.get("content"):
+            content += separator
+        _shift_offsets(part, len(content))
+        content += part.pop("content", "") or ""
+        for name, value in part.items():
+            if isinstance(value, list):
+                combined.setdefault(name, []).extend(value)
+            else:
+                combined.setdefault(name, value)
+    combined["content"] = content
+    return AnalyzeResult(combined)
+
+
+async def analyze_document_in_ranges(filename: str, model_id: str = "prebuilt-read", pages_per_request: int = 20,
+                                     max_concurrency: int = 4) -> AnalyzeResult:
+    """
+    Analyze a long PDF as concurrent requests over page ranges and stitch the results in page order.
+
+    With `max_concurrency` slots, wall-clock time grows with (pages / pages_per_request / max_concurrency)
+    rather than with the page count. Each request uploads only its own pages, so the file is sent
+    once in total rather than once per range. Each range is cached on its own, so a failed range is
+    the only one repeated on retry. Short documents (or when pypdf isn't installed) use a single request.
+
+    Args:
+        filename: Path to the PDF on disk
+        model_id: Document Intelligence model, e.g. "prebuilt-read"
+        pages_per_request: Pages analyzed by each request
+        max_concurrency: Maximum number of range requests in flight
+
+    Returns:
+        One `AnalyzeResult` covering the whole document
+    """
+    count = await asyncio.to_thread(page_count, filename)
+    if not count or count <= pages_per_request:
+        return await analyze_document(filename, model_id=model_id)
+
+    digest = await asyncio.to_thread(file_hash, filename)
+    slots = asyncio.Semaphore(max_concurrency)
+
+    async def analyze_range(first: int) -> AnalyzeResult:
+        last = min(first + pages_per_request - 1, count)
+        async with slots:
+            return await analyze_page_range(filename, first, last, model_id=model_id, digest=digest)
+
+    first_pages = list(range(1, count + 1, pages_per_request))
+    results = await asyncio.gather(*(analyze_range(first) for first in first_pages))
+    return stitch_results(results, first_pages=first_pages)
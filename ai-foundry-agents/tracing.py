@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# --------------------------
+# Spans
+# --------------------------
+
+@dataclass
+class Span:
+    """One timed step of a run: a pipeline, workflow executor, agent run, tool call or Document Intelligence poll."""
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    first_token_ns: Optional[int] = None
+    tokens_in: int = 0
+    tokens_out: int = 0
+    retries: int = 0
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration_s(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    @property
+    def ttft_s(self) -> Optional[float]:
+        return (self.first_token_ns - self.start_ns) / 1e9 if self.first_token_ns else None
+
+    def first_token(self) -> None:
+        if self.first_token_ns is None:
+            self.first_token_ns = time.time_ns()
+
+    def add_tokens(self, tokens_in: Optional[int] = 0, tokens_out: Optional[int] = 0) -> None:
+        self.tokens_in += tokens_in or 0
+        self.tokens_out += tokens_out or 0
+
+    def to_otel(self) -> Dict[str, Any]:
+        """The span in the OTLP/JSON span layout, so the file can be replayed into an OpenTelemetry collector."""
+        attributes = {"span.kind": self.kind, "retries": self.retries, **self.attributes}
+        if self.tokens_in or self.tokens_out:
+            attributes["gen_ai.usage.input_tokens"] = self.tokens_in
+            attributes["gen_ai.usage.output_tokens"] = self.tokens_out
+        if self.ttft_s is not None:
+            attributes["ttft_s"] = round(self.ttft_s, 4)
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otel_value(value)} for key, value in attributes.items() if value is not None],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+
+
+def _otel_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# The innermost open span of the running task; child spans attach to it
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+# --------------------------
+# Tracer
+# --------------------------
+
+class Tracer:
+    """
+    Records spans and appends each finished one to a JSONL file (one OTLP/JSON span per line).
+
+    Spans nest through a context variable, so concurrent invoices or documents each build their own
+    tree; every root span starts a new trace id. `summary()` folds the spans into a flame-style tree.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, kind: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """Open a span without making it current, for steps that start and end in different places (e.g. on events)."""
+        parent = parent or _current_span.get()
+        return Span(
+            name=name,
+            kind=kind,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+        )
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        line = json.dumps(span.to_otel())
+        with self._lock:
+            self.spans.append(span)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attributes: Any) -> Iterator[Span]:
+        """Time the body as a child of the current span."""
+        span = self.start_span(name, kind, **attributes)
+        token = _current_span.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(span, error)
+
+    def summary(self, width: int = 30) -> str:
+        """
+        Flame-style summary: spans grouped by their path of names, in the order they first started.
+
+        Time is summed over every span on a path, so with concurrent work the totals exceed wall time;
+        percentages are relative to the root spans.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        by_id = {s.span_id: s for s in spans}
+
+        def path(span: Span) -> Tuple[str, ...]:
+            names = [span.name]
+            while span.parent_id in by_id:
+                span = by_id[span.parent_id]
+                names.append(span.name)
+            return tuple(reversed(names))
+
+        groups: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        for span in spans:
+            group = groups.setdefault(path(span), {"count": 0, "seconds": 0.0, "ttft": [], "in": 0, "out": 0,
+                                                   "retries": 0, "errors": 0, "order": len(groups)})
+            group["count"] += 1
+            group["seconds"] += span.duration_s
+            if span.ttft_s is not None:
+                group["ttft"].append(span.ttft_s)
+            group["in"] += span.tokens_in
+            group["out"] += span.tokens_out
+            group["retries"] += span.retries
+            group["errors"] += span.error is not None
+        if not groups:
+            return "No spans recorded"
+
+        total = sum(g["seconds"] for p, g in groups.items() if len(p) == 1) or 1e-9
+        order = {p: g["order"] for p, g in groups.items()}
+        lines = [f"=== Trace summary ({len(spans)} spans) ==="]
+        for p in sorted(groups, key=lambda p: tuple(order.get(p[:i + 1], 0) for i in range(len(p)))):
+            g = groups[p]
+            label = ("  " * (len(p) - 1) + p[-1])[:40]
+            line = (f"{label:<40} {g['count']:>4}x {g['seconds']:>8.2f}s {100 * g['seconds'] / total:>5.1f}% "
+                    f"{'#' * min(width, max(1, round(width * g['seconds'] / total))):<{width}}")
+            if g["ttft"]:
+                line += f" ttft {sum(g['ttft']) / len(g['ttft']):.2f}s"
+            if g["in"] or g["out"]:
+                line += f" tokens {g['in']}/{g['out']}"
+            if g["retries"]:
+                line += f" retries {g['retries']}"
+            if g["errors"]:
+                line += f" errors {g['errors']}"
+            lines.append(line.rstrip())
+        return "\n".join(lines)
+
+
+def traced(kind: str, name: Optional[str] = None):
+    """Decorator: record each call of an async function as a span."""
+    def wrap(func):
+        @wraps(func)
+        async def run(*args, **kwargs):
+            with get_tracer().span(name or func.__name__, kind):
+                return await func(*args, **kwargs)
+        return run
+    return wrap
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    """The process-wide tracer; spans are written to TRACE_FILE (default traces.jsonl, empty to keep them in memory only)."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(os.getenv("TRACE_FILE", "traces.jsonl") or None)
+    return _tracer
@@ -1,5 +1,6 @@
 import streamlit as st
 import openai, os, requests, json
+from response_cache import ResponseCache
 
 openai.api_type = "azure"
 openai.api_version = "2023-08-01-preview"
@@ -15,33 +16,72 @@ search_key = os.getenv("AZURE_SEARCH_KEY")
 search_index_name = "<index name>" 
 document_library = "https://<storage account name>.blob.core.windows.net/<storage account container>"
 
+# Response cache setup
+# Answers are cached in a file shared by all sessions, so common questions skip search and the LLM.
+# By default only exactly the same normalized question reuses an answer. Set a threshold (e.g. 0.95)
+# to also reuse answers for near-duplicate questions whose embeddings' cosine similarity is at least
+# that and that mention the same identifiers (e.g. directive numbers)
+response_cache_file = "response_cache.sqlite"
+response_cache_ttl_seconds = 24 * 3600
+response_cache_max_entries = 5000
+semantic_cache_threshold = None
+embedding_deployment_id = "text-embedding-ada-002"
+
+# Stream answers token by token as they're generated instead of waiting for the full completion
+stream_responses = True
+
 # Add the text embedding RAG middleware to the OpenAI session used to retrieve LLM responses
-def setup_byod(deployment_id: str) -> None:
+def setup_byod(deployment_id: str, pool_size: int = 20) -> requests.Session:
+    # The extensions endpoint is the same for every request, so build it once
+    extensions_url = f"{openai.api_base}/openai/deployments/{deployment_id}/extensions/chat/completions?api-version={openai.api_version}"
+
     class BringYourOwnDataAdapter(requests.adapters.HTTPAdapter):
 
         def send(self, request, **kwargs):
-            request.url = f"{openai.api_base}/openai/deployments/{deployment_id}/extensions/chat/completions?api-version={openai.api_version}"
+            request.url = extensions_url
             return super().send(request, **kwargs)
 
     session = requests.Session()
 
-    # Mount a custom adapter which will use the extensions endpoint for any call using the given `deployment_id`
+    # Mount a custom adapter which will use the extensions endpoint for any call using the given `deployment_id`.
+    # Adapters keep a pool of keep-alive connections, so TLS setup is paid once rather than per question
     session.mount(
         prefix=f"{openai.api_base}/openai/deployments/{deployment_id}",
-        adapter=BringYourOwnDataAdapter()
+        adapter=BringYourOwnDataAdapter(pool_connections=1, pool_maxsize=pool_size)
     )
+    session.mount(prefix="https://", adapter=requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
 
     openai.requestssession = session
+    return session
+
+# Streamlit re-runs this script on every interaction; create the pooled session once per process
+@st.cache_resource
+def get_byod_session(deployment_id: str) -> requests.Session:
+    return setup_byod(deployment_id)
 
-setup_byod(deployment_id)
+openai.requestssession = get_byod_session(deployment_id)
 
 st.title('Generative AI using Azure AI Search Vector Embeddings')
 
-@st.cache_data
-def fetch_response(prompt_text):
-  completion = openai.ChatCompletion.create(
+def embed_prompt(text):
+  response = openai.Embedding.create(input=text, deployment_id=embedding_deployment_id)
+  return response["data"][0]["embedding"]
+
+# One cache object per process; the file behind it is shared and survives restarts
+@st.cache_resource
+def get_response_cache():
+  return ResponseCache(
+    response_cache_file,
+    ttl_seconds=response_cache_ttl_seconds,
+    max_entries=response_cache_max_entries,
+    embed=embed_prompt if semantic_cache_threshold else None,
+    similarity_threshold=semantic_cache_threshold or 1.0)
+
+def create_completion(prompt_text, stream=False):
+  return openai.ChatCompletion.create(
     messages=prompt_text,
     deployment_id=deployment_id,
+    stream=stream,
     dataSources=[ 
         {
             "type": "AzureCognitiveSearch",
@@ -52,8 +92,37 @@ def fetch_response(prompt_text):
             }
         }
     ])
-  
-  return completion
+
+def fetch_response(prompt_text):
+  completion = create_completion(prompt_text)
+  answer = completion.choices[0].message.content
+  context_json_string = completion.choices[0].message.context.messages[0].content
+  return answer, json.loads(context_json_string)
+
+# Yield the (role, delta) pairs of one streamed chunk. Depending on the API version the
+# extensions endpoint sends either `delta` directly or a list of `messages`, each with a delta
+def stream_deltas(chunk):
+  for choice in chunk.get("choices", []):
+    if "delta" in choice:
+      yield choice["delta"].get("role"), choice["delta"]
+    for message in choice.get("messages", []):
+      yield message.get("delta", {}).get("role"), message.get("delta", {})
+
+# Render the answer as tokens arrive; the citations come in the stream's context and are parsed at the end
+def stream_response(prompt_text, placeholder):
+  answer = ""
+  context_json_string = None
+  for chunk in create_completion(prompt_text, stream=True):
+    for role, delta in stream_deltas(chunk):
+      if "context" in delta:
+        context_json_string = delta["context"]["messages"][0]["content"]
+      elif role == "tool":
+        context_json_string = delta.get("content")
+      elif delta.get("content"):
+        answer += delta["content"]
+        placeholder.markdown(answer)
+  context_json = json.loads(context_json_string) if context_json_string else {"citations": []}
+  return answer, context_json
 
 # this is the text box where the user enters their question
 # Example questions:
@@ -70,15 +139,29 @@ prompt = st.text_area("I'm an expert in FAA Airworthiness Directives. What do yo
 #   4. Forward the updated prompt to the OpenAI LLM for a response
 if st.button("Ask"):
     data_load_state = st.text('Loading Response...')
-    message_text = [{"role": "user", "content": prompt}]
-    completion = fetch_response(message_text)
-    
-    # Write LLM Response to output
-    data_load_state.text("Done!")
-    st.write(completion.choices[0].message.content)
+    response_cache = get_response_cache()
+    # An empty question is never looked up or stored
+    cached = response_cache.get(prompt) if prompt.strip() else None
+
+    if cached is not None:
+        answer, context_json = cached.answer, cached.context
+        data_load_state.text(f"Done! (from cache, {cached.match} match)")
+        st.write(answer)
+    else:
+        message_text = [{"role": "user", "content": prompt}]
+        if stream_responses:
+            answer, context_json = stream_response(message_text, st.empty())
+        else:
+            answer, context_json = fetch_response(message_text)
+            st.write(answer)
+
+        # Save the answer with its citations so the next matching question can reuse it. An empty
+        # answer (e.g. a content-filtered stream) isn't cached, so the question is asked again next time
+        if prompt.strip() and answer.strip():
+            response_cache.put(prompt, answer, context_json)
+        data_load_state.text("Done!")
     
     # Present a button to read the original PDF document 
-    context_json_string = completion.choices[0].message.context.messages[0].content
-    context_json = json.loads(context_json_string)
-    doc_url = f"{document_library}/{context_json['citations'][0]['title']}"
-    st.link_button("Read Source Document", doc_url)
+    if context_json['citations']:
+        doc_url = f"{document_library}/{context_json['citations'][0]['title']}"
+        st.link_button("Read Source Document", doc_url)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation, so trivially different prompts match."""
+    text = " ".join(unicodedata.normalize("NFKC", prompt).casefold().split())
+    return text.rstrip(" ?!.")
+
+
+def prompt_identifiers(prompt: str) -> frozenset:
+    """Tokens containing a digit (directive numbers, models, years), which a semantic match must share."""
+    return frozenset(re.findall(r"[\w-]*\d[\w-]*", normalize_prompt(prompt)))
+
+
+@dataclass
+class CachedResponse:
+    answer: str
+    context: Any          # the citation payload returned with the original answer
+    match: str            # "exact" or "semantic"
+    score: float = 1.0    # cosine similarity of the matched prompt (1.0 for exact hits)
+
+
+class ResponseCache:
+    """
+    A response cache shared by every session and process that opens the same SQLite file.
+
+    - `get()` first looks for an exact match on the normalized prompt. If `embed` is given,
+      it then looks for a previously answered prompt whose embedding has cosine similarity
+      of at least `similarity_threshold` (a near-duplicate question) and that mentions the same
+      identifiers, so "directive 2019-25-55" never gets the answer cached for "directive 2019-21-51".
+    - Entries expire after `ttl_seconds`. Past `max_entries`, the least recently used
+      entries are evicted.
+    - The cache is a file, so it survives app restarts and can be put on a shared volume.
+    """
+
+    def __init__(self, path: str = "response_cache.sqlite", ttl_seconds: float = 24 * 3600,
+                 max_entries: int = 5000, embed: Optional[Callable[[str], List[float]]] = None,
+                 similarity_threshold: float = 0.95):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                prompt TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                context TEXT,
+                embedding BLOB,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )""")
+        # Bumped whenever entries are added or removed, so other processes know to reload embeddings
+        self._db.execute("CREATE TABLE IF NOT EXISTS generation (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER)")
+        self._db.execute("INSERT OR IGNORE INTO generation VALUES (0, 0)")
+        self._db.commit()
+
+        # In-process copy of the stored embeddings, reloaded when any process writes to the file
+        self._generation = None
+        self._keys: List[str] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        # Recently computed prompt embeddings, so a miss followed by put() embeds only once
+        self._recent_embeddings: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    @staticmethod
+    def _key(prompt: str) -> str:
+        return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+    def _embedding(self, prompt: str) -> np.ndarray:
+        """Unit-length embedding of a prompt. Call without the lock held, as it may call the embedding API."""
+        normalized = normalize_prompt(prompt)
+        with self._lock:
+            vector = self._recent_embeddings.get(normalized)
+        if vector is None:
+            vector = np.asarray(self.embed(prompt), dtype=np.float32)
+            vector /= max(np.linalg.norm(vector), 1e-12)
+            with self._lock:
+                self._recent_embeddings[normalized] = vector
+                while len(self._recent_embeddings) > 256:
+                    self._recent_embeddings.popitem(last=False)
+        return vector
+
+    def _refresh_matrix(self) -> None:
+        generation = self._db.execute("SELECT value FROM generation").fetchone()[0]
+        if generation == self._generation:
+            return
+        rows = self._db.execute(
+            "SELECT key, embedding FROM responses WHERE embedding IS NOT NULL AND created_at >= ?",
+            (time.time() - self.ttl_seconds,)).fetchall()
+        self._keys = [key for key, _ in rows]
+        self._matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows \
+            else np.empty((0, 0), dtype=np.float32)
+        self._generation = generation
+
+    def _hit(self, key: str, match: str, score: float) -> Optional[CachedResponse]:
+        row = self._db.execute(
+            "SELECT answer, context FROM responses WHERE key = ? AND created_at >= ?",
+            (key, time.time() - self.ttl_seconds)).fetchone()
+        if row is None:
+            return None
+        self._db.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        answer, context = row
+        if not answer.strip():
+            # Written by an older version that cached empty answers
+            return None
+        return CachedResponse(answer, json.loads(context) if context else None, match, score)
+
+    def get(self, prompt: str) -> Optional[CachedResponse]:
+        if not prompt.strip():
+            return None
+        with self._lock:
+            hit = self._hit(self._key(prompt), "exact", 1.0)
+            if hit or self.embed is None:
+                return hit
+
+        # Other lookups aren't held up while the prompt is being embedded
+        embedding = self._embedding(prompt)
+        identifiers = prompt_identifiers(prompt)
+        with self._lock:
+            self._refresh_matrix()
+            if not len(self._keys):
+                return None
+            scores = self._matrix @ embedding
+            for best in np.argsort(-scores, kind="stable"):
+                if scores[best] < self.similarity_threshold:
+                    return None
+                key = self._keys[best]
+                row = self._db.execute("SELECT prompt FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and prompt_identifiers(row[0]) == identifiers:
+                    return self._hit(key, "semantic", float(scores[best]))
+            return None
+
+    def put(self, prompt: str, answer: str, context: Any = None) -> None:
+        """Store an answer; empty prompts and empty answers are ignored."""
+        if not prompt.strip() or not answer.strip():
+            return
+        embedding = self._embedding(prompt).tobytes() if self.embed is not None else None
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._key(prompt), prompt, answer, json.dumps(context), embedding, now, now))
+            self._evict(now)
+            self._db.execute("UPDATE generation SET value = value + 1")
+            self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._db.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )""", (self.max_entries,))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.execute("UPDATE generation SET value = value + 1")
+            self._db.commit()
@@ -1,4 +1,5 @@
-import openai, os, requests, sys
+import openai, os, requests, sys, json, csv, math, time, random, argparse, threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 openai.api_type = "azure"
 
@@ -15,30 +16,34 @@ search_endpoint = "";
 search_key = ""
 search_index_name = ""; # Add your Azure Cognitive Search index name here
 
-def setup_byod(deployment_id: str) -> None:
+def setup_byod(deployment_id: str, pool_size: int = 20) -> requests.Session:
+    # The extensions endpoint is the same for every request, so build it once
+    extensions_url = f"{openai.api_base}/openai/deployments/{deployment_id}/extensions/chat/completions?api-version={openai.api_version}"
+
     class BringYourOwnDataAdapter(requests.adapters.HTTPAdapter):
 
         def send(self, request, **kwargs):
-            request.url = f"{openai.api_base}/openai/deployments/{deployment_id}/extensions/chat/completions?api-version={openai.api_version}"
+            request.url = extensions_url
             return super().send(request, **kwargs)
 
     session = requests.Session()
 
-    # Mount a custom adapter which will use the extensions endpoint for any call using the given `deployment_id`
+    # Mount a custom adapter which will use the extensions endpoint for any call using the given `deployment_id`.
+    # Adapters keep a pool of keep-alive connections, so repeated questions reuse the same TLS connection
     session.mount(
         prefix=f"{openai.api_base}/openai/deployments/{deployment_id}",
-        adapter=BringYourOwnDataAdapter()
+        adapter=BringYourOwnDataAdapter(pool_connections=1, pool_maxsize=pool_size)
     )
+    session.mount(prefix="https://", adapter=requests.adapters.HTTPAdapter(pool_maxsize=pool_size))
+
     openai.requestssession = session
-    
-if __name__ == "__main__":
-    question = sys.argv[1]
-    
-    setup_byod(deployment_id)
+    return session
 
-    completion = openai.ChatCompletion.create(
+def create_completion(question: str, stream: bool = False):
+    return openai.ChatCompletion.create(
         messages=[{"role": "user", "content": question}],
         deployment_id=deployment_id,
+        stream=stream,
         dataSources=[  
             {
                 "type": "AzureCognitiveSearch",
@@ -50,6 +55,163 @@ if __name__ == "__main__":
             }
         ]
     )
-        
-    response = completion["choices"][0]["message"]["content"]
-    print(response)
+
+def stream_deltas(chunk):
+    # Depending on the API version the extensions endpoint sends either `delta` directly
+    # or a list of `messages`, each with a delta
+    for choice in chunk.get("choices", []):
+        if "delta" in choice:
+            yield choice["delta"].get("role"), choice["delta"]
+        for message in choice.get("messages", []):
+            yield message.get("delta", {}).get("role"), message.get("delta", {})
+
+def stream_answer(question: str, on_token=None) -> tuple:
+    """Stream the answer, calling on_token for each token; returns (answer, citations) once the stream ends."""
+    answer = ""
+    context_json_string = None
+    for chunk in create_completion(question, stream=True):
+        for role, delta in stream_deltas(chunk):
+            if "context" in delta:
+                context_json_string = delta["context"]["messages"][0]["content"]
+            elif role == "tool":
+                context_json_string = delta.get("content")
+            elif delta.get("content"):
+                answer += delta["content"]
+                if on_token:
+                    on_token(delta["content"])
+    citations = json.loads(context_json_string).get("citations", []) if context_json_string else []
+    return answer, citations
+
+def fetch_answer(question: str) -> tuple:
+    completion = create_completion(question)
+    message = completion["choices"][0]["message"]
+    context = message.get("context")
+    citations = json.loads(context["messages"][0]["content"]).get("citations", []) if context else []
+    return message["content"], citations
+
+def print_citations(citations) -> None:
+    for i, citation in enumerate(citations, start=1):
+        print(f"[doc{i}] {citation.get('title') or citation.get('url') or ''}")
+    
+def read_questions(path: str):
+    """Yield (id, question) from a CSV file with a `question` column, or JSONL / plain text lines (`-` reads stdin)."""
+    f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if path.lower().endswith(".csv"):
+            for i, row in enumerate(csv.DictReader(f)):
+                yield row.get("id") or i, row["question"]
+            return
+        for i, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                yield row.get("id", i), row["question"]
+            else:
+                yield i, line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "http_status", None) == 429 or type(error).__name__ == "RateLimitError"
+
+def answer_with_retry(question: str, max_retries: int = 5) -> tuple:
+    for attempt in range(max_retries + 1):
+        try:
+            return fetch_answer(question)
+        except Exception as e:
+            if not is_rate_limit(e) or attempt == max_retries:
+                raise
+            time.sleep(random.uniform(0, min(30, 2 ** attempt)))
+
+def percentile(values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+def run_batch(path: str, output, concurrency: int = 8) -> dict:
+    """
+    Answer every question in `path` with up to `concurrency` requests in flight over the pooled session.
+
+    Each result is written to `output` as a JSON line as soon as it finishes (so results are in
+    completion order, matched to their input by `id`). Returns latency percentiles and throughput.
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def ask(question_id, question):
+        nonlocal errors
+        started = time.perf_counter()
+        result = {"id": question_id, "question": question}
+        try:
+            result["answer"], result["citations"] = answer_with_retry(question)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_seconds"] = round(time.perf_counter() - started, 3)
+        with lock:
+            if "error" in result:
+                errors += 1
+            else:
+                latencies.append(result["latency_seconds"])
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Keep at most `concurrency` questions queued beyond the running ones, so stdin can be streamed
+        pending = set()
+        for question_id, question in read_questions(path):
+            if len(pending) >= concurrency * 2:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending.add(executor.submit(ask, question_id, question))
+        wait(pending)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "questions": len(latencies) + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "questions_per_second": round((len(latencies) + errors) / elapsed, 2) if elapsed else 0.0,
+        "p50_seconds": percentile(latencies, 50),
+        "p95_seconds": percentile(latencies, 95),
+        "p99_seconds": percentile(latencies, 99),
+    }
+    
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask a question of Azure OpenAI grounded on an Azure Cognitive Search index")
+    parser.add_argument("question", nargs="?")
+    parser.add_argument("--no-stream", action="store_true", help="wait for the full answer instead of printing tokens as they arrive")
+    parser.add_argument("--batch", metavar="FILE", help="answer every question in a JSONL, CSV or text file (`-` for stdin), writing JSONL results")
+    parser.add_argument("--output", metavar="FILE", help="where to write batch results (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=8, help="questions in flight at once in batch mode")
+    args = parser.parse_args()
+    if not args.question and not args.batch:
+        parser.error("give a question or --batch FILE")
+
+    if args.batch:
+        setup_byod(deployment_id, pool_size=args.concurrency)
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            summary = run_batch(args.batch, output, concurrency=args.concurrency)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        print(json.dumps(summary), file=sys.stderr)
+        # Non-zero when any question failed, so scripts and CI notice partial results
+        sys.exit(1 if summary["errors"] else 0)
+
+    setup_byod(deployment_id)
+
+    if args.no_stream:
+        response, citations = fetch_answer(args.question)
+        print(response)
+    else:
+        response, citations = stream_answer(args.question, on_token=lambda token: print(token, end="", flush=True))
+        print()
+
+    print_citations(citations)
@@ -9,7 +9,7 @@ from setuptools import setup, find_packages
 
 setup(
     name='shared_utils', #needs to build fabric
-    version='1.0.0',
+    version='1.1.0',
     description='A sample library of utilities to use in Fabric notebooks',
     packages=find_packages(),  
     install_requires=['pyarrow'],
@@ -0,0 +1 @@
+from .keyvault_utils import clear_secret_cache, get_keyvault_secret, get_secrets
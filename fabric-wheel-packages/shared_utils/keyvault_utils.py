@@ -1,15 +1,104 @@
-def get_keyvault_secret(key_vault_name, key_name):
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Secrets are kept for an hour by default, so notebook cells and Spark tasks that run again
+# in the same Python process don't go back to Key Vault
+DEFAULT_SECRET_TTL_SECONDS = 60 * 60
+
+# Key Vault access tokens are valid for about an hour; refresh well before they expire
+TOKEN_TTL_SECONDS = 45 * 60
+
+_lock = threading.Lock()
+_token = None                # (access token, expires at)
+_secrets = {}                # (vault url, key name) -> (secret, expires at)
+_fetch_locks = {}            # (vault url, key name) -> lock held while that secret is fetched
+
+
+def _vault_url(key_vault_name):
+  return f"https://{key_vault_name}.vault.azure.net/"
+
+
+def _get_access_token():
+  global _token
+  with _lock:
+    if _token is not None and _token[1] > time.monotonic():
+      return _token[0]
+
   from notebookutils import mssparkutils
-  from trident_token_library_wrapper import PyTridentTokenLibrary as tl
 
   # Get access token to key vault for current session ID
   access_token = mssparkutils.credentials.getToken("keyvault")
+  with _lock:
+    _token = (access_token, time.monotonic() + TOKEN_TTL_SECONDS)
+  return access_token
+
+
+def _cached(key):
+  with _lock:
+    entry = _secrets.get(key)
+    if entry is not None and entry[1] > time.monotonic():
+      return entry[0]
+    return None
+
+
+def _fetch(key, ttl_seconds, access_token):
+  with _lock:
+    fetch_lock = _fetch_locks.setdefault(key, threading.Lock())
+
+  # Threads asking for the same secret wait for one fetch instead of each calling Key Vault
+  with fetch_lock:
+    secret = _cached(key)
+    if secret is not None:
+      return secret
+
+    from trident_token_library_wrapper import PyTridentTokenLibrary as tl
+
+    vault_url, key_name = key
+    secret = tl.get_secret_with_token(vault_url, key_name, access_token or _get_access_token())
+    with _lock:
+      _secrets[key] = (secret, time.monotonic() + ttl_seconds)
+
+    # Print this for demo purposes (not recommended in production code)
+    print(f"Got a secret with {len(secret)} bytes length.")
+    return secret
+
+
+def get_keyvault_secret(key_vault_name, key_name, ttl_seconds=DEFAULT_SECRET_TTL_SECONDS, access_token=None):
+  '''
+    Return a Key Vault secret, from the process-wide cache when it was fetched less than ttl_seconds ago.
+
+    Safe to call from several threads. The Key Vault access token is reused until shortly before it
+    expires. Where mssparkutils can't issue tokens (e.g. on Spark executors), pass access_token, or
+    read the secrets on the driver and hand the values to the tasks.
+  '''
+  key = (_vault_url(key_vault_name), key_name)
+  secret = _cached(key)
+  if secret is not None:
+    return secret
+  return _fetch(key, ttl_seconds, access_token)
+
+
+def get_secrets(key_vault_name, key_names, ttl_seconds=DEFAULT_SECRET_TTL_SECONDS, access_token=None):
+  '''
+    Return {key name: secret} for several secrets of one vault.
+
+    Cached secrets are returned without a round-trip; the rest are fetched concurrently with one access token.
+  '''
+  vault_url = _vault_url(key_vault_name)
+  secrets = {name: _cached((vault_url, name)) for name in key_names}
+  missing = [name for name, secret in secrets.items() if secret is None]
+  if missing:
+    access_token = access_token or _get_access_token()
+    with ThreadPoolExecutor(max_workers=min(8, len(missing))) as pool:
+      fetched = pool.map(lambda name: _fetch((vault_url, name), ttl_seconds, access_token), missing)
+      secrets.update(zip(missing, fetched))
+  return secrets
+
 
-  secret = tl.get_secret_with_token( \
-    f"https://{key_vault_name}.vault.azure.net/", \
-    key_name, \
-    access_token)
-  
-  # Print this for demo purposes (not recommended in production code)
-  print(f"Got a secret with {len(secret)} bytes length.")
-  return secret
\ No newline at end of file
+def clear_secret_cache():
+  '''Forget cached secrets and the access token, e.g. after a secret was rotated.'''
+  global _token
+  with _lock:
+    _token = None
+    _secrets.clear()
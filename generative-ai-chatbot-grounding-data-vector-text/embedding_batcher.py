@@ -0,0 +1,198 @@
+import asyncio
+import inspect
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_ENCODING.encode(text))
+except ImportError:
+    # Rough estimate (about 4 characters per token) when tiktoken isn't installed
+    def count_tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """True for HTTP 429 errors from either the pre-1.0 or 1.x OpenAI SDK (or anything shaped like them)."""
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+@dataclass
+class BatchStats:
+    chunks: int = 0
+    tokens: int = 0
+    requests: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.chunks} chunks / {self.tokens} tokens in {self.seconds:.1f}s "
+                f"({self.chunks_per_sec:.1f} chunks/sec, {self.tokens_per_sec:.0f} tokens/sec), "
+                f"{self.requests} requests, {self.retries} retries")
+
+
+class EmbeddingBatcher:
+    """
+    Embeds items concurrently in batches packed up to a token budget, and upserts them as they finish.
+
+    - Items are packed into a batch until adding the next one would exceed `max_tokens_per_batch`
+      (or `max_items_per_batch`), instead of a fixed count per request.
+    - Up to `max_in_flight` embedding requests run at once. A 429 halves the allowed concurrency
+      and the request is retried with exponential backoff and full jitter; concurrency then grows
+      back by one after each run of successful requests.
+    - Finished batches go to a single upsert worker, so writing to the vector DB overlaps with
+      embedding the next batches.
+
+    `embeddings` is any LangChain `Embeddings` (e.g. `OpenAIEmbeddings` or `CachedEmbeddings`);
+    its blocking `embed_documents` runs in a worker thread.
+    """
+
+    def __init__(self, embeddings: Any, max_tokens_per_batch: int = 8000, max_items_per_batch: int = 256,
+                 max_in_flight: int = 4, max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 token_counter: Callable[[str], int] = count_tokens):
+        self.embeddings = embeddings
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_items_per_batch = max_items_per_batch
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.token_counter = token_counter
+
+    def pack(self, items: Iterable[Any], text_of: Callable[[Any], str]) -> Iterator[tuple]:
+        """Yield (items, texts, token_count) batches that fit the token and item budgets."""
+        batch, texts, tokens = [], [], 0
+        for item in items:
+            text = text_of(item)
+            n = self.token_counter(text)
+            if batch and (tokens + n > self.max_tokens_per_batch or len(batch) >= self.max_items_per_batch):
+                yield batch, texts, tokens
+                batch, texts, tokens = [], [], 0
+            batch.append(item)
+            texts.append(text)
+            tokens += n
+        if batch:
+            yield batch, texts, tokens
+
+    async def run(self, items: Iterable[Any], text_of: Callable[[Any], str],
+                  upsert: Callable[[List[Any], List[List[float]]], Any],
+                  progress: Optional[Callable[[int], Any]] = None) -> BatchStats:
+        """
+        Embed all items and pass each finished batch to `upsert(items, vectors)`.
+
+        Args:
+            items: Rows/documents to embed
+            text_of: Returns the text to embed for an item
+            upsert: Writes a batch to the vector DB; may be a plain function or a coroutine function
+            progress: Optional callback given the number of chunks in each upserted batch (e.g. tqdm.update)
+
+        Returns:
+            Throughput statistics for the run
+        """
+        stats = BatchStats()
+        started = time.perf_counter()
+
+        limit = self.max_in_flight
+        active = 0
+        successes = 0
+        slots = asyncio.Condition()
+        done: asyncio.Queue = asyncio.Queue(maxsize=self.max_in_flight * 2)
+
+        async def embed(texts: Sequence[str]) -> List[List[float]]:
+            nonlocal limit, successes
+            for attempt in range(self.max_retries + 1):
+                try:
+                    stats.requests += 1
+                    vectors = await asyncio.to_thread(self.embeddings.embed_documents, list(texts))
+                    async with slots:
+                        successes += 1
+                        if successes >= limit and limit < self.max_in_flight:
+                            limit += 1
+                            successes = 0
+                            slots.notify_all()
+                    return vectors
+                except Exception as e:
+                    if not is_rate_limit(e) or attempt == self.max_retries:
+                        raise
+                    stats.retries += 1
+                    async with slots:
+                        limit = max(1, limit // 2)
+                        successes = 0
+                    await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+        async def embed_batch(batch: List[Any], texts: List[str], tokens: int) -> None:
+            nonlocal active
+            try:
+                vectors = await embed(texts)
+                stats.tokens += tokens
+                await done.put((batch, vectors))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                async with slots:
+                    active -= 1
+                    slots.notify_all()
+
+        async def upsert_worker() -> None:
+            try:
+                while True:
+                    item = await done.get()
+                    if item is None:
+                        return
+                    batch, vectors = item
+                    if inspect.iscoroutinefunction(upsert):
+                        await upsert(batch, vectors)
+                    else:
+                        await asyncio.to_thread(upsert, batch, vectors)
+                    stats.chunks += len(batch)
+                    if progress:
+                        progress(len(batch))
+            except Exception as e:
+                # Stop embedding batches that could no longer be written
+                errors.append(e)
+                for task in list(tasks):
+                    task.cancel()
+
+        errors: List[Exception] = []
+        tasks = set()
+        writer = asyncio.create_task(upsert_worker())
+        try:
+            for batch, texts, tokens in self.pack(items, text_of):
+                async with slots:
+                    await slots.wait_for(lambda: active < limit)
+                    active += 1
+                # Surface failures early instead of after every batch has been submitted
+                if errors:
+                    raise errors[0]
+                task = asyncio.create_task(embed_batch(batch, texts, tokens))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if errors:
+                raise errors[0]
+            await done.put(None)
+            await writer
+            if errors:
+                raise errors[0]
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            writer.cancel()
+
+        stats.seconds = time.perf_counter() - started
+        return stats
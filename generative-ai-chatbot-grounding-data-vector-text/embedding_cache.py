@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+from langchain.embeddings.base import Embeddings
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivially different copies share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embeddings model (e.g. `OpenAIEmbeddings`) with a two-tier cache.
+
+    Vectors are keyed by (model, hash of normalized text). Lookups check a size-bounded
+    in-memory LRU first, then a SQLite file on disk that persists across sessions; only
+    texts found in neither are sent to the model, in a single batched call.
+
+    `stats()` returns hit/miss/eviction counters to see how much embedding spend is saved.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, cache_path: str = "embedding_cache.sqlite",
+                 max_memory_items: int = 10000):
+        self.embeddings = embeddings
+        self.model = model
+        self.max_memory_items = max_memory_items
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        directory = os.path.dirname(cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    # --------------------------
+    # Cache tiers
+    # --------------------------
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Add to the memory tier, evicting least recently used entries past the size bound."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    found[key] = vector
+
+            on_disk = [key for key in keys if key not in found]
+            # Query in slices to stay under SQLite's bound-parameter limit
+            for start in range(0, len(on_disk), 500):
+                chunk = on_disk[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._counters["disk_hits"] += 1
+                    self._remember(key, vector)
+                    found[key] = vector
+        return found
+
+    def _store(self, items: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                                 [(key, vector.tobytes()) for key, vector in items.items()])
+            self._db.commit()
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+    # --------------------------
+    # Embeddings interface
+    # --------------------------
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model, text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Send each distinct uncached text to the model once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            with self._lock:
+                self._counters["misses"] += len(missing)
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            self._store(new)
+            found.update(new)
+
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Namespace for chunk IDs, so the same chunk always maps to the same vector ID
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1d7c52-4a0e-4b8f-9c6e-2d5b8a3f9e10")
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in blocks so large manuals aren't loaded at once."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """
+    Persistent record of which files and chunks are already in the vector database.
+
+    Each file is keyed by its content hash, and each of its chunks by a deterministic ID
+    derived from (source, page, content hash). Re-loading a file whose hash hasn't changed is
+    skipped entirely, and for a changed file only chunks that are new get embedded. Chunks that
+    disappeared are returned for deletion and kept as tombstones in the manifest.
+
+    The manifest is a JSON file written atomically, so it can live next to the notebook
+    (or in a Lakehouse folder) and survive across nightly runs.
+    """
+
+    def __init__(self, path: str = "ingest_manifest.json"):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.tombstones: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.tombstones = data.get("tombstones", {})
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "tombstones": self.tombstones}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(file: str) -> str:
+        return os.path.normpath(file)
+
+    def is_unchanged(self, file: str, digest: str) -> bool:
+        entry = self.files.get(self._key(file))
+        return entry is not None and entry["file_hash"] == digest
+
+    def chunk_ids(self, source: str, chunks: Iterable[Tuple[int, str]],
+                  seen: Optional[Dict[Tuple[int, str], int]] = None) -> List[Tuple[str, str]]:
+        """
+        Deterministic (id, content hash) for each (page, text) chunk of a file.
+
+        Identical text on the same page (e.g. repeated headers) is told apart by its ordinal,
+        so every chunk still gets a unique ID. When a file's chunks are passed in several
+        batches, pass the same `seen` dict with each batch so ordinals carry over.
+        """
+        seen = {} if seen is None else seen
+        out = []
+        for page, text in chunks:
+            digest = content_hash(text)
+            ordinal = seen.get((page, digest), 0)
+            seen[(page, digest)] = ordinal + 1
+            chunk_id = uuid.uuid5(CHUNK_ID_NAMESPACE, f"{self._key(source)}|{page}|{digest}|{ordinal}")
+            out.append((str(chunk_id), digest))
+        return out
+
+    def plan(self, file: str, chunk_ids: List[Tuple[str, str]]) -> Tuple[List[int], List[str]]:
+        """
+        Compare a file's freshly split chunks with what the manifest says is stored.
+
+        Returns:
+            (positions of chunks that need embedding/upserting, IDs of stored chunks to delete)
+        """
+        entry = self.files.get(self._key(file), {"chunks": {}})
+        stored = entry["chunks"]
+        to_upsert = [pos for pos, (chunk_id, _) in enumerate(chunk_ids) if chunk_id not in stored]
+        current = {chunk_id for chunk_id, _ in chunk_ids}
+        to_delete = [chunk_id for chunk_id in stored if chunk_id not in current]
+        return to_upsert, to_delete
+
+    def commit(self, file: str, digest: str, chunk_ids: List[Tuple[str, str]], deleted: List[str]) -> None:
+        """Record a file as fully loaded. Call only after upserts and deletes have succeeded."""
+        self.files[self._key(file)] = {
+            "file_hash": digest,
+            "chunks": {chunk_id: chunk_digest for chunk_id, chunk_digest in chunk_ids},
+            "loaded_at": time.time(),
+        }
+        for chunk_id, _ in chunk_ids:
+            self.tombstones.pop(chunk_id, None)
+        self._tombstone(file, deleted)
+        self.save()
+
+    def stored_ids(self, file: str) -> List[str]:
+        entry = self.files.get(self._key(file))
+        return list(entry["chunks"]) if entry else []
+
+    def forget(self, file: str) -> None:
+        """Tombstone every chunk of a file that no longer exists. Call after deleting them from the index."""
+        deleted = self.stored_ids(file)
+        self.files.pop(self._key(file), None)
+        self._tombstone(file, deleted)
+        self.save()
+
+    def missing_files(self, folder: str, existing: Iterable[str]) -> List[str]:
+        """
+        Files recorded as loaded from `folder` that are no longer among `existing`.
+
+        Only files directly in `folder` are considered, so syncing one folder never removes
+        files that were loaded from another.
+        """
+        folder = self._key(folder)
+        existing = {self._key(f) for f in existing}
+        return [f for f in self.files if os.path.dirname(f) == folder and f not in existing]
+
+    def _tombstone(self, file: str, chunk_ids: List[str]) -> None:
+        now = time.time()
+        for chunk_id in chunk_ids:
+            self.tombstones[chunk_id] = {"source": self._key(file), "deleted_at": now}
@@ -0,0 +1,481 @@
+import json
+import os
+import threading
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from langchain.docstore.document import Document
+from langchain.embeddings.base import Embeddings
+from langchain.vectorstores.base import VectorStore
+
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ORDER_FILE = "ivf_order.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+
+# Number of stored vectors scored per matrix multiply when searching exactly.
+# Keeps the temporary score matrix small even for very large indexes.
+SCAN_BLOCK_ROWS = 65536
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (indices, scores) of the k largest scores in each row, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class _View(NamedTuple):
+    """The arrays a search reads, taken together under the lock so a concurrent upsert or persist can't mix them."""
+    vectors: np.ndarray
+    pending_vectors: np.ndarray
+    alive: np.ndarray
+    ids: List[str]
+    metadata: List[dict]
+    centroids: Optional[np.ndarray]
+    ivf_order: Optional[np.ndarray]
+    ivf_offsets: Optional[np.ndarray]
+
+
+class LocalVectorIndex:
+    """
+    An in-process vector index that stands in for `pinecone.Index`.
+
+    Vectors are kept as a float32 matrix saved with NumPy and memory-mapped back
+    from disk, so opening a large index is instant and only touched pages are read.
+    Searches are exact batched dot products by default; call `build_ivf()` to add an
+    inverted-file (IVF) approximate mode that only scans the closest clusters.
+
+    The write API mirrors Pinecone (`upsert(vectors=[(id, values, metadata), ...])`,
+    `delete(ids=[...])`, `query(vector=..., top_k=...)`), so existing loading code works unchanged.
+    Upserts are buffered in memory and searchable immediately; call `persist()` to write them to disk.
+
+    Writers never modify an array a search may be reading; they swap in new ones under the lock,
+    so searches only hold the lock long enough to take a consistent view of the index.
+    """
+
+    def __init__(self, directory: str, dimension: int = 1536, metric: str = "dotproduct"):
+        if metric not in ("dotproduct", "cosine"):
+            raise ValueError(f"Unsupported metric: {metric}")
+
+        self.directory = directory
+        self.dimension = dimension
+        self.metric = metric
+        self._lock = threading.Lock()
+
+        self._ids: List[str] = []
+        self._metadata: List[dict] = []
+        self._row_of: dict = {}
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+
+        # Rows upserted since the last persist()
+        self._pending_vectors = np.empty((0, dimension), dtype=np.float32)
+
+        # Optional IVF structures (see build_ivf)
+        self._centroids: Optional[np.ndarray] = None
+        self._ivf_order: Optional[np.ndarray] = None
+        self._ivf_offsets: Optional[np.ndarray] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    # --------------------------
+    # Storage
+    # --------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open(self) -> None:
+        vectors_path = self._path(VECTORS_FILE)
+        if not os.path.exists(vectors_path):
+            return
+
+        self._vectors = np.load(vectors_path, mmap_mode="r")
+        if self._vectors.shape[1] != self.dimension:
+            raise ValueError(
+                f"Index at {self.directory} has dimension {self._vectors.shape[1]}, expected {self.dimension}")
+
+        with open(self._path(RECORDS_FILE), "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                record = json.loads(line)
+                self._ids.append(record["id"])
+                self._metadata.append(record["metadata"])
+                self._row_of[record["id"]] = row
+        self._alive = np.ones(len(self._ids), dtype=bool)
+
+        if os.path.exists(self._path(CENTROIDS_FILE)):
+            self._centroids = np.load(self._path(CENTROIDS_FILE))
+            self._ivf_order = np.load(self._path(IVF_ORDER_FILE), mmap_mode="r")
+            self._ivf_offsets = np.load(self._path(IVF_OFFSETS_FILE))
+
+    def persist(self) -> None:
+        """Write buffered upserts and deletes to disk and re-open the matrix memory-mapped."""
+        with self._lock:
+            self._flush_pending()
+            live_rows = np.flatnonzero(self._alive)
+            vectors = np.ascontiguousarray(self._vectors[live_rows], dtype=np.float32)
+            ids = [self._ids[r] for r in live_rows]
+            metadata = [self._metadata[r] for r in live_rows]
+            # Deleting rows renumbers the ones after them, so the clusters have to be rebuilt;
+            # rows that were only appended are added to their closest existing cluster
+            rebuild_ivf = self._centroids is not None and len(live_rows) != len(self._ids)
+
+            # Write to temp files first so a crash never leaves a half-written index behind
+            tmp_vectors = self._path(VECTORS_FILE + ".tmp")
+            with open(tmp_vectors, "wb") as f:
+                np.save(f, vectors)
+            tmp_records = self._path(RECORDS_FILE + ".tmp")
+            with open(tmp_records, "w", encoding="utf-8") as f:
+                for id, meta in zip(ids, metadata):
+                    f.write(json.dumps({"id": id, "metadata": meta}) + "\n")
+
+            # Release the old memory map before replacing the file it points to
+            self._vectors = vectors
+            os.replace(tmp_vectors, self._path(VECTORS_FILE))
+            os.replace(tmp_records, self._path(RECORDS_FILE))
+
+            self._ids = ids
+            self._metadata = metadata
+            self._row_of = {id: row for row, id in enumerate(ids)}
+            self._alive = np.ones(len(ids), dtype=bool)
+            self._vectors = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+
+            # Done under the same lock, so no search ever pairs the old clusters with renumbered rows
+            if rebuild_ivf:
+                self._build_ivf(len(self._centroids))
+            elif self._centroids is not None:
+                if len(ids) > len(self._ivf_order):
+                    self._extend_ivf()
+                self._save_ivf()
+
+    def _flush_pending(self) -> None:
+        """Move buffered rows into the main matrix (in memory only)."""
+        if not len(self._pending_vectors):
+            return
+        self._vectors = np.concatenate([np.asarray(self._vectors), self._pending_vectors])
+        self._pending_vectors = np.empty((0, self.dimension), dtype=np.float32)
+
+    # --------------------------
+    # Pinecone-compatible write API
+    # --------------------------
+
+    def _prepare(self, values: Any) -> np.ndarray:
+        matrix = np.asarray(values, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix[None, :]
+        if matrix.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got {matrix.shape[1]}")
+        if self.metric == "cosine":
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.maximum(norms, 1e-12)
+        return matrix
+
+    def upsert(self, vectors: Iterable[Tuple[str, List[float], dict]], **kwargs: Any) -> dict:
+        """Insert or replace (id, values, metadata) tuples, the same shape `pinecone.Index.upsert` accepts."""
+        vectors = list(vectors)
+        if not vectors:
+            return {"upserted_count": 0}
+
+        ids = [str(v[0]) for v in vectors]
+        matrix = self._prepare([v[1] for v in vectors])
+        metadata = [v[2] if len(v) > 2 else {} for v in vectors]
+
+        with self._lock:
+            first_row = len(self._ids)
+            self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+            for offset, (id, meta) in enumerate(zip(ids, metadata)):
+                # Replacing an id tombstones its old row; persist() drops it from disk
+                old_row = self._row_of.get(id)
+                if old_row is not None:
+                    self._alive[old_row] = False
+                self._ids.append(id)
+                self._metadata.append(meta)
+                self._row_of[id] = first_row + offset
+            self._pending_vectors = np.concatenate([self._pending_vectors, matrix])
+
+        return {"upserted_count": len(ids)}
+
+    def delete(self, ids: Iterable[str], **kwargs: Any) -> dict:
+        with self._lock:
+            # Tombstone on a copy, so a search holding the current mask isn't changed under it
+            alive = self._alive.copy()
+            for id in ids:
+                row = self._row_of.pop(id, None)
+                if row is not None:
+                    alive[row] = False
+            self._alive = alive
+        return {}
+
+    def fetch(self, ids: Iterable[str]) -> dict:
+        with self._lock:
+            rows = {id: self._row_of[id] for id in ids if id in self._row_of}
+            view = self._view()
+        vectors = {}
+        for id, row in rows.items():
+            vectors[id] = {"id": id, "values": self._row(view, row).tolist(), "metadata": view.metadata[row]}
+        return {"vectors": vectors}
+
+    def describe_index_stats(self) -> dict:
+        return {
+            "dimension": self.dimension,
+            "total_vector_count": int(self._alive.sum()),
+            "ivf_lists": 0 if self._centroids is None else len(self._centroids),
+        }
+
+    @staticmethod
+    def _row(view: _View, row: int) -> np.ndarray:
+        stored = len(view.vectors)
+        return view.vectors[row] if row < stored else view.pending_vectors[row - stored]
+
+    def _view(self) -> _View:
+        """Current arrays of the index. Call with the lock held."""
+        return _View(self._vectors, self._pending_vectors, self._alive, self._ids, self._metadata,
+                     self._centroids, self._ivf_order, self._ivf_offsets)
+
+    # --------------------------
+    # Search
+    # --------------------------
+
+    def build_ivf(self, n_lists: int = 256, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Cluster the stored vectors with k-means and group rows by cluster (an IVF index).
+
+        Queries with `n_probe` set then score only the rows in the `n_probe` closest clusters,
+        trading a little recall for scanning a fraction of the matrix.
+        """
+        if len(self._pending_vectors) or not self._alive.all():
+            self.persist()
+
+        # Held throughout so a concurrent persist() can't renumber the rows being clustered;
+        # searches keep using the previous clusters until the new ones are swapped in
+        with self._lock:
+            self._build_ivf(n_lists, iterations, seed)
+
+    def _build_ivf(self, n_lists: int, iterations: int = 10, seed: int = 0) -> None:
+        """k-means over the stored vectors, saved to disk. Call with the lock held and nothing buffered."""
+        vectors = np.asarray(self._vectors)
+        if not len(vectors):
+            # Nothing left to cluster: searches with n_probe fall back to the exact scan
+            self._centroids = self._ivf_order = self._ivf_offsets = None
+            for name in (CENTROIDS_FILE, IVF_ORDER_FILE, IVF_OFFSETS_FILE):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            return
+        n_lists = max(1, min(n_lists, len(vectors)))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = vectors[assign == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+
+        self._centroids = centroids.astype(np.float32)
+        self._set_ivf(assign)
+        self._save_ivf()
+
+    def _set_ivf(self, assign: np.ndarray) -> None:
+        """Group rows by their cluster, given each row's cluster number."""
+        self._ivf_order = np.argsort(assign, kind="stable")
+        self._ivf_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(self._centroids)))])
+
+    def _extend_ivf(self) -> None:
+        """Add rows appended since the clusters were built to their closest cluster. Call with the lock held."""
+        clustered = len(self._ivf_order)
+        assign = np.empty(clustered, dtype=np.int64)
+        assign[self._ivf_order] = np.repeat(np.arange(len(self._centroids)), np.diff(self._ivf_offsets))
+        appended = np.asarray(self._vectors[clustered:])
+        self._set_ivf(np.concatenate([assign, np.argmax(appended @ self._centroids.T, axis=1)]))
+
+    def _save_ivf(self) -> None:
+        np.save(self._path(CENTROIDS_FILE), self._centroids)
+        np.save(self._path(IVF_ORDER_FILE), self._ivf_order)
+        np.save(self._path(IVF_OFFSETS_FILE), self._ivf_offsets)
+
+    def search(self, queries: Any, top_k: int = 4, n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched top-k search.
+
+        Args:
+            queries: A single vector or a (batch, dimension) matrix of query vectors
+            top_k: Number of neighbours to return per query
+            n_probe: If set and an IVF index was built, search only this many closest clusters
+
+        Returns:
+            (rows, scores) arrays of shape (batch, top_k); rows are -1 where fewer matches exist
+        """
+        queries = self._prepare(queries)
+        with self._lock:
+            view = self._view()
+        return self._search(view, queries, top_k, n_probe)
+
+    def _search(self, view: _View, queries: np.ndarray, top_k: int,
+                n_probe: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        if n_probe is not None:
+            return self._search_ivf(view, queries, top_k, n_probe)
+        return self._search_exact(view, queries, top_k)
+
+    def _search_exact(self, view: _View, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best_rows = np.full((len(queries), 0), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+
+        blocks = [(0, view.vectors)]
+        if len(view.pending_vectors):
+            blocks.append((len(view.vectors), view.pending_vectors))
+
+        for base, matrix in blocks:
+            for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+                block = matrix[start:start + SCAN_BLOCK_ROWS]
+                scores = queries @ block.T
+                alive = view.alive[base + start:base + start + len(block)]
+                scores[:, ~alive] = -np.inf
+                rows, top = _top_k(scores, top_k)
+                # Merge this block's winners with the running best
+                rows = np.concatenate([best_rows, rows + base + start], axis=1)
+                top = np.concatenate([best_scores, top], axis=1)
+                keep, best_scores = _top_k(top, top_k)
+                best_rows = np.take_along_axis(rows, keep, axis=1)
+
+        best_rows[~np.isfinite(best_scores)] = -1
+        return best_rows, best_scores
+
+    def _search_ivf(self, view: _View, queries: np.ndarray, top_k: int,
+                    n_probe: int) -> Tuple[np.ndarray, np.ndarray]:
+        if view.centroids is None or not len(view.centroids):
+            # No IVF built (or every row was deleted since): scan everything
+            return self._search_exact(view, queries, top_k)
+        n_probe = min(n_probe, len(view.centroids))
+        probe_lists, _ = _top_k(queries @ view.centroids.T, n_probe)
+
+        # Rows added after the clusters were built (buffered, or persisted before they were
+        # assigned) are not in any cluster yet, so every query scans them
+        unclustered = np.arange(len(view.ivf_order), len(view.alive))
+        unclustered = unclustered[view.alive[unclustered]]
+
+        stored_rows = len(view.vectors)
+        all_rows = np.full((len(queries), top_k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probe_lists):
+            candidates = np.concatenate(
+                [view.ivf_order[view.ivf_offsets[c]:view.ivf_offsets[c + 1]] for c in lists])
+            candidates = np.concatenate([candidates[view.alive[candidates]], unclustered])
+            if not len(candidates):
+                continue
+            # Sorted rows keep memory-mapped reads sequential; pending rows sort to the end
+            candidates = np.sort(candidates)
+            stored = candidates[candidates < stored_rows]
+            vectors = view.vectors[stored]
+            if len(stored) < len(candidates):
+                pending_rows = candidates[len(stored):] - stored_rows
+                vectors = np.concatenate([vectors, view.pending_vectors[pending_rows]])
+            rows, scores = _top_k((vectors @ queries[q])[None, :], top_k)
+            all_rows[q, :rows.shape[1]] = candidates[rows[0]]
+            all_scores[q, :rows.shape[1]] = scores[0]
+        return all_rows, all_scores
+
+    def query(self, vector: List[float], top_k: int = 4, include_metadata: bool = True,
+              n_probe: Optional[int] = None, **kwargs: Any) -> dict:
+        """Single-vector search returning Pinecone's `{"matches": [...]}` response shape."""
+        queries = self._prepare(vector)
+        with self._lock:
+            view = self._view()
+        rows, scores = self._search(view, queries, top_k, n_probe)
+        return {"matches": self._matches(view, rows[0], scores[0], include_metadata)}
+
+    def query_batch(self, vectors: Any, top_k: int = 4, include_metadata: bool = True,
+                    n_probe: Optional[int] = None) -> List[dict]:
+        """Search many query vectors with one matrix multiply per block."""
+        queries = self._prepare(vectors)
+        with self._lock:
+            view = self._view()
+        rows, scores = self._search(view, queries, top_k, n_probe)
+        return [{"matches": self._matches(view, r, s, include_metadata)} for r, s in zip(rows, scores)]
+
+    @staticmethod
+    def _matches(view: _View, rows: np.ndarray, scores: np.ndarray, include_metadata: bool) -> List[dict]:
+        matches = []
+        for row, score in zip(rows, scores):
+            if row < 0:
+                continue
+            match = {"id": view.ids[row], "score": float(score)}
+            if include_metadata:
+                match["metadata"] = view.metadata[row]
+            matches.append(match)
+        return matches
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain vector store over a `LocalVectorIndex`, a drop-in for
+    `langchain.vectorstores.Pinecone(index, embed, "context")`.
+    """
+
+    def __init__(self, index: LocalVectorIndex, embedding: Embeddings, text_key: str = "context",
+                 n_probe: Optional[int] = None):
+        self._index = index
+        self._embedding = embedding
+        self._text_key = text_key
+        self._n_probe = n_probe
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        import uuid
+
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = self._embedding.embed_documents(texts)
+        records = [(id, v, {**meta, self._text_key: text})
+                   for id, v, meta, text in zip(ids, vectors, metadatas, texts)]
+        self._index.upsert(vectors=records)
+        return ids
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        response = self._index.query(embedding, top_k=k, include_metadata=True,
+                                     n_probe=kwargs.get("n_probe", self._n_probe))
+        results = []
+        for match in response["matches"]:
+            metadata = dict(match["metadata"])
+            text = metadata.pop(self._text_key, "")
+            results.append((Document(page_content=text, metadata=metadata), match["score"]))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _similarity_search_with_relevance_scores(self, query: str, k: int = 4,
+                                                 **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score(query, k, **kwargs)
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   directory: str = "vector_index", text_key: str = "context", **kwargs: Any) -> "LocalVectorStore":
+        index = LocalVectorIndex(directory, dimension=len(embedding.embed_query("dimension probe")))
+        store = cls(index, embedding, text_key)
+        store.add_texts(texts, metadatas, **kwargs)
+        index.persist()
+        return store
@@ -0,0 +1,112 @@
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+def _split_page_range(file: str, start: int, end: int, chunk_size: int,
+                      chunk_overlap: int) -> List[Tuple[int, List[str]]]:
+    """
+    Worker: extract and split pages [start, end) of a PDF.
+
+    Runs in a separate process. pypdf reads pages lazily, so each worker only parses the
+    pages it was given. Every page is split on its own, exactly as `split_documents` does
+    with the per-page documents returned by `PyPDFLoader`, so chunk boundaries and overlap match.
+    The file is opened for this range only, so no worker holds on to a file (or the pages
+    parsed from it) once its range is done.
+    """
+    with open(file, "rb") as f:
+        reader = PdfReader(f)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return [(page, splitter.split_text(reader.pages[page].extract_text())) for page in range(start, end)]
+
+
+class PdfChunker:
+    """
+    Streams chunks out of PDFs, splitting pages in parallel across a process pool.
+
+    Produces the same chunks and metadata (`source`, 0-based `page`) as
+    `RecursiveCharacterTextSplitter.split_documents(PyPDFLoader(file).load())`, but:
+
+    - pages are handed to worker processes in small ranges, so every core is used;
+    - results are yielded in page order as they complete, with at most `max_pending`
+      ranges outstanding, so memory stays bounded even for very large manuals;
+    - `iter_files` keeps the pool busy across file boundaries when loading a whole folder,
+      and streams each file's chunks range by range instead of collecting the file first.
+
+    Use it as a context manager (or call `close()`) so the worker processes are shut down.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 150, pages_per_task: int = 8,
+                 max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.pages_per_task = pages_per_task
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> "PdfChunker":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _tasks(self, files: Iterable[str]) -> Iterator[Tuple[str, int, int]]:
+        """(file, start page, end page) for every page range of every file."""
+        for file in files:
+            # Counting pages only parses the page tree; the reader is closed before any range is split
+            with open(file, "rb") as f:
+                page_count = len(PdfReader(f).pages)
+            # An empty range still reports the file, so callers see every file they passed
+            if page_count == 0:
+                yield file, 0, 0
+            for start in range(0, page_count, self.pages_per_task):
+                yield file, start, min(start + self.pages_per_task, page_count)
+
+    def _ranges(self, files: Iterable[str]) -> Iterator[Tuple[str, List[Document]]]:
+        """Yield (file, documents) per page range in order, keeping up to max_pending ranges in flight."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        pending: deque = deque()
+        for file, start, end in self._tasks(files):
+            pending.append((file, self._pool.submit(
+                _split_page_range, file, start, end, self.chunk_size, self.chunk_overlap)))
+            # Wait for the oldest range only once the window is full, so order is preserved
+            while len(pending) >= self.max_pending:
+                yield self._collect(*pending.popleft())
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    @staticmethod
+    def _collect(file: str, future) -> Tuple[str, List[Document]]:
+        docs = [Document(page_content=chunk, metadata={"source": file, "page": page})
+                for page, chunks in future.result() for chunk in chunks]
+        return file, docs
+
+    def iter_chunks(self, file: str) -> Iterator[Document]:
+        """Yield the chunks of one PDF in page order."""
+        for _, docs in self._ranges([file]):
+            yield from docs
+
+    def iter_files(self, files: Iterable[str]) -> Iterator[Tuple[str, Iterator[Document]]]:
+        """
+        Yield (file, chunks) for each PDF in order, while later files are already being split.
+
+        `chunks` is an iterator that yields the file's ranges as they complete, so at most
+        `max_pending` ranges are held in memory however large the file is. Like `itertools.groupby`,
+        it shares the underlying stream: consume it before advancing to the next file (anything
+        left unread is skipped).
+        """
+        for file, ranges in itertools.groupby(self._ranges(files), key=lambda item: item[0]):
+            yield file, (doc for _, docs in ranges for doc in docs)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from embedding_batcher import EmbeddingBatcher
+
+
+class StubEmbeddingServer:
+    """
+    Local HTTP server shaped like the embeddings endpoint: POST {"input": [...]} returns one vector per text.
+
+    The first `rate_limited` requests are answered with HTTP 429, every request takes `delay` seconds,
+    and the texts of each request and the peak number of concurrent requests are recorded.
+    """
+
+    def __init__(self, delay: float = 0.0, rate_limited: int = 0, fail: bool = False):
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.fail = fail
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                texts = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["input"]
+                with stub._lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status = 429 if stub.rate_limited else 500 if stub.fail else 200
+                    stub.rate_limited = max(0, stub.rate_limited - 1)
+                    if status == 200:
+                        stub.requests.append(texts)
+                time.sleep(stub.delay)
+                body = json.dumps({"data": [{"embedding": [float(len(t)), 1.0]} for t in texts]}).encode()
+                with stub._lock:
+                    stub.in_flight -= 1
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/embeddings"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HttpEmbeddings:
+    """Minimal client of the stub server with the `embed_documents` method of LangChain embeddings."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def embed_documents(self, texts):
+        request = urllib.request.Request(self.url, data=json.dumps({"input": texts}).encode(),
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return [item["embedding"] for item in json.load(response)["data"]]
+        except urllib.error.HTTPError as e:
+            # Shaped like the OpenAI 1.x errors the batcher recognizes
+            e.status_code = e.code
+            raise
+
+
+@pytest.fixture
+def server_factory():
+    servers = []
+
+    def make(**kwargs):
+        server = StubEmbeddingServer(**kwargs)
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.close()
+
+
+def _words(text):
+    return len(text.split())
+
+
+def _run(batcher, texts):
+    upserted = []
+    stats = asyncio.run(batcher.run(list(enumerate(texts)), text_of=lambda item: item[1],
+                                    upsert=lambda batch, vectors: upserted.extend(zip(batch, vectors))))
+    return stats, upserted
+
+
+def test_batches_fit_token_and_item_budgets(server_factory):
+    server = server_factory()
+    texts = [" ".join(["word"] * (1 + i % 7)) for i in range(60)]
+    batcher = EmbeddingBatcher(HttpEmbeddings(server.url), max_tokens_per_batch=20, max_items_per_batch=8,
+                               token_counter=_words)
+
+    stats, upserted = _run(batcher, texts)
+
+    assert all(sum(_words(t) for t in request) <= 20 and len(request) <= 8 for request in server.requests)
+    assert sorted(position for (position, _), _ in upserted) == list(range(60))
+    assert all(vector[0] == len(text) for (_, text), vector in upserted)
+    assert stats.chunks == 60 and stats.requests == len(server.requests)
+    assert stats.tokens == sum(_words(t) for t in texts)
+
+
+def test_requests_in_flight_stay_within_limit(server_factory):
+    server = server_factory(delay=0.05)
+    batcher = EmbeddingBatcher(HttpEmbeddings(server.url), max_items_per_batch=1, max_in_flight=3,
+                               token_counter=_words)
+
+    _, upserted = _run(batcher, [f"text {i}" for i in range(12)])
+
+    assert len(upserted) == 12
+    assert 1 < server.max_in_flight <= 3
+
+
+def test_rate_limited_requests_are_retried(server_factory):
+    server = server_factory(rate_limited=3)
+    batcher = EmbeddingBatcher(HttpEmbeddings(server.url), max_items_per_batch=2, max_in_flight=2,
+                               base_delay=0.01, max_delay=0.05, token_counter=_words)
+
+    stats, upserted = _run(batcher, [f"text {i}" for i in range(10)])
+
+    assert stats.retries == 3
+    assert sorted(position for (position, _), _ in upserted) == list(range(10))
+
+
+def test_other_errors_are_raised(server_factory):
+    server = server_factory(fail=True)
+    batcher = EmbeddingBatcher(HttpEmbeddings(server.url), max_retries=2, base_delay=0.01,
+                               token_counter=_words)
+
+    with pytest.raises(urllib.error.HTTPError):
+        _run(batcher, ["a", "b"])
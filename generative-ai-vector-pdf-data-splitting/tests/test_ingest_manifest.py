@@ -0,0 +1,33 @@
+import os
+
+from ingest_manifest import IngestManifest
+
+
+def _load(manifest, file):
+    chunk_ids = manifest.chunk_ids(file, [(1, f"text of {file}")])
+    manifest.commit(file, "digest", chunk_ids, [])
+    return chunk_ids
+
+
+def test_missing_files_only_in_synced_folder(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manual = os.path.join("files", "2019-21-51_Emergency.pdf")
+    kept = os.path.join("..", "aviation_grounding_data", "kept.pdf")
+    removed = os.path.join("..", "aviation_grounding_data", "removed.pdf")
+    for file in (manual, kept, removed):
+        _load(manifest, file)
+
+    assert manifest.missing_files("../aviation_grounding_data", [kept]) == [os.path.normpath(removed)]
+    assert manifest.missing_files("files", [manual]) == []
+    assert manifest.missing_files("files/", []) == [os.path.normpath(manual)]
+
+
+def test_forget_tombstones_chunks(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    chunk_ids = _load(manifest, "files/a.pdf")
+
+    manifest.forget("files/a.pdf")
+
+    reloaded = IngestManifest(manifest.path)
+    assert reloaded.missing_files("files", []) == []
+    assert set(reloaded.tombstones) == {chunk_id for chunk_id, _ in chunk_ids}
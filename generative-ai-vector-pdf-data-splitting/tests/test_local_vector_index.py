@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from local_vector_index import LocalVectorIndex
+
+DIMENSION = 8
+
+
+def _unit(rows: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimension=DIMENSION)
+    index.upsert(vectors=[(f"v{i}", v, {"i": i}) for i, v in enumerate(_unit(50, seed=1))])
+    index.build_ivf(n_lists=4)
+    return index
+
+
+def _ivf_ids(index, vector, n_probe=1):
+    return [m["id"] for m in index.query(vector, top_k=3, n_probe=n_probe)["matches"]]
+
+
+def test_upserted_row_found_before_persist(index):
+    new = _unit(1, seed=2)[0]
+    index.upsert(vectors=[("new", new, {})])
+    assert _ivf_ids(index, new)[0] == "new"
+
+
+def test_upserted_row_found_after_persist(index, tmp_path):
+    new = _unit(1, seed=2)[0]
+    index.upsert(vectors=[("new", new, {})])
+    index.persist()
+
+    assert len(index._ivf_order) == 51
+    assert _ivf_ids(index, new)[0] == "new"
+
+    reopened = LocalVectorIndex(str(tmp_path), dimension=DIMENSION)
+    assert len(reopened._ivf_order) == 51
+    assert _ivf_ids(reopened, new)[0] == "new"
+
+
+def test_replaced_row_found_after_persist(index):
+    moved = _unit(1, seed=3)[0]
+    index.upsert(vectors=[("v7", moved, {"i": 7})])
+    index.persist()
+
+    assert len(index._ivf_order) == 50
+    assert _ivf_ids(index, moved)[0] == "v7"
+
+
+def test_ivf_with_every_list_matches_exact(index):
+    index.upsert(vectors=[(f"new{i}", v, {}) for i, v in enumerate(_unit(5, seed=4))])
+    index.delete(ids=["v0", "v1"])
+    index.persist()
+
+    queries = _unit(10, seed=5)
+    exact_rows, _ = index.search(queries, top_k=5)
+    ivf_rows, _ = index.search(queries, top_k=5, n_probe=4)
+    np.testing.assert_array_equal(exact_rows, ivf_rows)
+
+
+def test_query_with_n_probe_after_deleting_everything(index, tmp_path):
+    index.delete(ids=[f"v{i}" for i in range(50)])
+    index.persist()
+
+    assert index.query(_unit(1, seed=6)[0], top_k=3, n_probe=2) == {"matches": []}
+    assert not (tmp_path / "ivf_centroids.npy").exists()
+
+    reopened = LocalVectorIndex(str(tmp_path), dimension=DIMENSION)
+    new = _unit(1, seed=7)[0]
+    reopened.upsert(vectors=[("new", new, {})])
+    assert _ivf_ids(reopened, new)[0] == "new"
+
+
+def test_search_during_rebuild_never_mixes_clusters_and_rows(index):
+    import threading
+
+    stop = threading.Event()
+    errors = []
+
+    def search():
+        while not stop.is_set():
+            try:
+                for response in index.query_batch(_unit(4, seed=8), top_k=3, n_probe=2):
+                    assert len(response["matches"]) == 3
+            except Exception as e:
+                errors.append(e)
+
+    searcher = threading.Thread(target=search)
+    searcher.start()
+    try:
+        for round in range(10):
+            index.delete(ids=[f"v{round}"])
+            index.upsert(vectors=[(f"r{round}", _unit(1, seed=100 + round)[0], {})])
+            index.persist()
+    finally:
+        stop.set()
+        searcher.join()
+    assert errors == []
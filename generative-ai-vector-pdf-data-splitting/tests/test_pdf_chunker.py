@@ -0,0 +1,45 @@
+import os
+import shutil
+
+from langchain.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from pdf_chunker import PdfChunker
+
+MANUAL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "files", "2019-21-51_Emergency.pdf")
+
+
+def _expected(file):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    return [(doc.metadata["source"], doc.metadata["page"], doc.page_content)
+            for doc in splitter.split_documents(PyPDFLoader(file).load())]
+
+
+def _flatten(docs):
+    return [(doc.metadata["source"], doc.metadata["page"], doc.page_content) for doc in docs]
+
+
+def test_chunks_match_pypdfloader():
+    with PdfChunker(pages_per_task=1, max_workers=2) as chunker:
+        assert _flatten(chunker.iter_chunks(MANUAL)) == _expected(MANUAL)
+
+
+def test_iter_files_streams_each_file(tmp_path):
+    files = []
+    for name in ("a.pdf", "b.pdf", "c.pdf"):
+        files.append(str(tmp_path / name))
+        shutil.copy(MANUAL, files[-1])
+
+    with PdfChunker(pages_per_task=1, max_workers=2, max_pending=2) as chunker:
+        seen = []
+        for file, docs in chunker.iter_files(files):
+            # Chunks arrive lazily rather than as a list collected for the whole file
+            assert not isinstance(docs, list)
+            if file == files[1]:
+                next(docs)  # partly consumed; the rest of b.pdf is skipped
+                seen.append((file, None))
+            else:
+                seen.append((file, _flatten(docs)))
+
+    assert seen == [(files[0], _expected(files[0])), (files[1], None), (files[2], _expected(files[2]))]
@@ -0,0 +1,135 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Update the summary of a conversation between a user and an assistant with the new turns below. "
+    "Keep names, facts, decisions and open questions; drop small talk. Reply with the summary only.\n\n"
+    "Summary so far:\n{summary}\n\nNew turns:\n{turns}"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough estimate (about 4 characters per token), so budgeting needs no round-trip to count_tokens
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class Message:
+    role: str   # "user" or "model", as Gemini names them
+    text: str
+
+
+class BoundedChatSession:
+    """
+    A Gemini chat whose context stays within a token budget.
+
+    `ChatSession.send_message` resends the whole history every turn, so latency and cost grow with
+    the conversation. Here each request carries a rolling summary of older turns plus the recent turns
+    that fit in `max_context_tokens`. Once a turn pushes the context over the budget, the oldest turns
+    are folded into the summary with one extra (non-streamed) call after the reply has been shown.
+
+    `messages` keeps the full transcript for display; `summarized` is how many of them are covered
+    by the summary rather than sent verbatim. `compact_error` holds the error of the last summary
+    call when it failed (it is retried after every reply, and cleared once one succeeds).
+    """
+
+    def __init__(self, model, max_context_tokens: int = 4000, min_recent_messages: int = 4,
+                 summary_model=None, count_tokens: Callable[[str], int] = estimate_tokens):
+        self.model = model
+        self.summary_model = summary_model or model
+        self.max_context_tokens = max_context_tokens
+        self.min_recent_messages = min_recent_messages
+        self.count_tokens = count_tokens
+        self.messages: List[Message] = []
+        self.summary = ""
+        self.summarized = 0
+        self.compact_error: Optional[Exception] = None
+
+    def _contents(self, prompt: Optional[str] = None) -> List[dict]:
+        contents = []
+        if self.summary:
+            # Gemini expects turns to alternate, so the summary goes in as a user turn with an acknowledgement
+            contents.append({"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]})
+            contents.append({"role": "model", "parts": ["Understood."]})
+        contents.extend({"role": m.role, "parts": [m.text]} for m in self.messages[self.summarized:])
+        if prompt is not None:
+            contents.append({"role": "user", "parts": [prompt]})
+        return contents
+
+    def context_tokens(self) -> int:
+        return sum(self.count_tokens(content["parts"][0]) for content in self._contents())
+
+    def stream_message(self, prompt: str) -> Iterator[str]:
+        """
+        Send a message and yield the reply as it arrives. The turn is recorded once the reply is complete.
+
+        A reply without any text (e.g. blocked by safety filters) isn't recorded: Gemini rejects empty
+        turns, and the prompt that caused it isn't sent again with later messages.
+        """
+        response = self.model.generate_content(self._contents(prompt), stream=True)
+        reply = []
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # A chunk without text (e.g. only safety ratings)
+                continue
+            reply.append(text)
+            yield text
+
+        text = "".join(reply)
+        if not text:
+            return
+        self.messages.append(Message("user", prompt))
+        self.messages.append(Message("model", text))
+        try:
+            self.compact()
+            self.compact_error = None
+        except Exception as e:
+            # The turns stay verbatim (over budget) and folding them is retried after the next reply
+            logger.warning("Summarizing older turns failed, %d tokens of context: %s", self.context_tokens(), e)
+            self.compact_error = e
+
+    def send_message(self, prompt: str) -> str:
+        return "".join(self.stream_message(prompt))
+
+    def compact(self) -> None:
+        """Fold the oldest verbatim turns into the summary until the context fits the budget."""
+        # The new summary is assumed to be about as long as the current one
+        tokens = self.count_tokens(self.summary) if self.summary else 0
+        tokens += sum(self.count_tokens(m.text) for m in self.messages[self.summarized:])
+        folded = self.summarized
+        while tokens > self.max_context_tokens and len(self.messages) - folded > self.min_recent_messages:
+            # Fold whole user/model pairs so the verbatim turns still start with a user message
+            tokens -= sum(self.count_tokens(m.text) for m in self.messages[folded:folded + 2])
+            folded += 2
+        if folded == self.summarized:
+            return
+
+        turns = "\n".join(f"{m.role}: {m.text}" for m in self.messages[self.summarized:folded])
+        response = self.summary_model.generate_content(
+            SUMMARY_PROMPT.format(summary=self.summary or "(none)", turns=turns))
+        self.summary = response.text.strip()
+        self.summarized = folded
+
+
+class FakeModel:
+    """
+    Stands in for `genai.GenerativeModel` to run the app without an API key: replies echo the prompt
+    word by word, and summaries are the first words of the turns they replace.
+    """
+
+    @dataclass
+    class _Chunk:
+        text: str
+
+    def generate_content(self, contents, stream: bool = False):
+        if isinstance(contents, str):
+            return self._Chunk(" ".join(contents.split("New turns:\n", 1)[-1].split()[:60]))
+        prompt = contents[-1]["parts"][0]
+        words = f"You said: {prompt} ({len(contents)} messages in context)".split(" ")
+        chunks = [self._Chunk(word + " ") for word in words]
+        return iter(chunks) if stream else self._Chunk("".join(c.text for c in chunks))
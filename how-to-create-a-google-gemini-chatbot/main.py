@@ -2,9 +2,17 @@ import streamlit as st
 import os
 import google.generativeai as genai
 
-# Initialize Gemini-Pro 
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_KEY"))
-model = genai.GenerativeModel('gemini-pro')
+from chat_session import BoundedChatSession, FakeModel
+
+# Initialize Gemini-Pro (or a local fake model when no API key is set)
+if os.getenv("GOOGLE_GEMINI_KEY"):
+    genai.configure(api_key=os.getenv("GOOGLE_GEMINI_KEY"))
+    model = genai.GenerativeModel('gemini-pro')
+else:
+    model = FakeModel()
+
+# Token budget for each request: a rolling summary of older turns plus the most recent turns
+MAX_CONTEXT_TOKENS = int(os.getenv("GEMINI_MAX_CONTEXT_TOKENS", "4000"))
 
 # Gemini uses 'model' for assistant; Streamlit uses 'assistant'
 def role_to_streamlit(role):
@@ -13,26 +21,38 @@ def role_to_streamlit(role):
   else:
     return role
 
-# Add a Gemini Chat history object to Streamlit session state
+def show_messages(messages):
+    for message in messages:
+        with st.chat_message(role_to_streamlit(message.role)):
+            st.markdown(message.text)
+
+# Add a bounded Gemini chat session to Streamlit session state
 if "chat" not in st.session_state:
-    st.session_state.chat = model.start_chat(history = [])
+    st.session_state.chat = BoundedChatSession(model, max_context_tokens=MAX_CONTEXT_TOKENS)
+chat = st.session_state.chat
 
 # Display Form Title
 st.title("Chat with Google Gemini-Pro!")
+if isinstance(model, FakeModel):
+    st.info("GOOGLE_GEMINI_KEY isn't set, so replies come from a local fake model.")
+
+# Turns already folded into the summary are only rendered on request, so each rerun
+# draws a bounded number of messages however long the conversation gets
+if chat.summarized and st.toggle(f"Show {chat.summarized} earlier messages"):
+    show_messages(chat.messages[:chat.summarized])
 
 # Display chat messages from history above current input box
-for message in st.session_state.chat.history:
-    with st.chat_message(role_to_streamlit(message.role)):
-        st.markdown(message.parts[0].text)
+show_messages(chat.messages[chat.summarized:])
 
 # Accept user's next message, add to context, resubmit context to Gemini
 if prompt := st.chat_input("I possess a well of knowledge. What would you like to know?"):
     # Display user's last message
     st.chat_message("user").markdown(prompt)
-    
-    # Send user entry to Gemini and read the response
-    response = st.session_state.chat.send_message(prompt) 
-    
-    # Display last 
+
+    # Send user entry to Gemini and display the response as it streams in
     with st.chat_message("assistant"):
-        st.markdown(response.text)
\ No newline at end of file
+        if not st.write_stream(chat.stream_message(prompt)):
+            st.warning("Gemini didn't return a reply to that message (it may have been blocked). Try rephrasing it.")
+    if chat.compact_error:
+        st.warning(f"Couldn't summarize older messages, so the whole conversation is being sent "
+                   f"({chat.context_tokens()} tokens). Retrying after the next reply: {chat.compact_error}")
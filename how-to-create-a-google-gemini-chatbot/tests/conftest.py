@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules live next to the Streamlit app rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
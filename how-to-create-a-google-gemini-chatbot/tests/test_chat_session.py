@@ -0,0 +1,95 @@
+from chat_session import BoundedChatSession, FakeModel, Message
+
+
+def _words(text):
+    return len(text.split())
+
+
+class FlakySummaries(FakeModel):
+    """FakeModel whose summary calls fail while `failing` is set."""
+
+    failing = True
+
+    def generate_content(self, contents, stream=False):
+        if isinstance(contents, str) and self.failing:
+            raise RuntimeError("summary unavailable")
+        return super().generate_content(contents, stream)
+
+
+class BlockedReplies:
+    """A model whose streamed chunks carry no text, like a reply blocked by safety filters."""
+
+    class _Chunk:
+        @property
+        def text(self):
+            raise ValueError("no text")
+
+    def generate_content(self, contents, stream=False):
+        return iter([self._Chunk(), self._Chunk()])
+
+
+def test_reply_streams_and_records_turn():
+    chat = BoundedChatSession(FakeModel())
+
+    reply = "".join(chat.stream_message("hello there"))
+
+    assert reply.startswith("You said: hello there")
+    assert chat.messages == [Message("user", "hello there"), Message("model", reply)]
+
+
+def test_compact_folds_whole_pairs_once_over_budget():
+    chat = BoundedChatSession(FakeModel(), max_context_tokens=40, min_recent_messages=2, count_tokens=_words)
+
+    chat.send_message("first question about aircraft")
+    assert chat.summarized == 0 and chat.summary == ""
+
+    i = 0
+    while chat.summarized == 0:
+        chat.send_message(f"follow up question number {i}")
+        i += 1
+
+    # The oldest pair went into the summary; the rest stay verbatim and start with a user turn
+    assert chat.summarized % 2 == 0
+    assert "first question about aircraft" in chat.summary
+    assert chat.messages[chat.summarized].role == "user"
+    assert len(chat.messages) - chat.summarized >= 2
+    verbatim = sum(_words(m.text) for m in chat.messages[chat.summarized:])
+    assert verbatim <= 40
+
+
+def test_contents_alternate_roles_with_summary():
+    chat = BoundedChatSession(FakeModel(), max_context_tokens=30, min_recent_messages=2, count_tokens=_words)
+    for i in range(4):
+        chat.send_message(f"question {i} with a few extra words")
+    assert chat.summary
+
+    contents = chat._contents("next question")
+
+    roles = [content["role"] for content in contents]
+    assert roles == ["user", "model"] * (len(roles) // 2) + ["user"]
+    assert contents[0]["parts"][0].startswith("Summary of our conversation so far:")
+    assert contents[-1]["parts"] == ["next question"]
+
+
+def test_empty_reply_is_not_recorded():
+    chat = BoundedChatSession(BlockedReplies())
+
+    assert chat.send_message("something blocked") == ""
+    assert chat.messages == []
+
+
+def test_failed_summary_is_reported_and_retried():
+    model = FlakySummaries()
+    chat = BoundedChatSession(model, max_context_tokens=30, min_recent_messages=2, count_tokens=_words)
+
+    for i in range(3):
+        chat.send_message(f"question {i} with a few extra words")
+    assert chat.summarized == 0
+    assert isinstance(chat.compact_error, RuntimeError)
+    assert len(chat.messages) == 6
+
+    model.failing = False
+    chat.send_message("one more question")
+
+    assert chat.compact_error is None
+    assert chat.summarized > 0 and chat.summary
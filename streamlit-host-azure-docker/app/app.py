@@ -1,36 +1,38 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 
+from snapshot import open_snapshot
+
 st.title('Uber pickups in NYC')
 
-DATE_COLUMN = 'date/time'
-DATA_URL = ('https://s3-us-west-2.amazonaws.com/'
-            'streamlit-demo-data/uber-raw-data-sep14.csv.gz')
+RAW_DATA_ROWS = 10000
+
+@st.cache_resource
+def load_data():
+    # The memory-mapped snapshot is shared by every session instead of copied into each one
+    return open_snapshot()
 
-@st.cache_data
-def load_data(nrows):
-    data = pd.read_csv(DATA_URL, nrows=nrows)
-    lowercase = lambda x: str(x).lower()
-    data.rename(lowercase, axis='columns', inplace=True)
-    data[DATE_COLUMN] = pd.to_datetime(data[DATE_COLUMN])
-    return data
+# A zero-copy slice of the rows in that hour, so only they are read and converted
+def load_hour(hour):
+    start, end = hour_offsets[hour], hour_offsets[hour + 1]
+    return data.slice(start, end - start).to_pandas()
 
 data_load_state = st.text('Loading data...')
-data = load_data(10000)
-data_load_state.text("Done! (using st.cache_data)")
+data, hour_offsets = load_data()
+data_load_state.text(f"Done! ({data.num_rows:,} pickups, using st.cache_resource)")
 
 if st.checkbox('Show raw data'):
-    st.subheader('Raw data')
-    st.write(data)
+    st.subheader(f'Raw data (first {min(RAW_DATA_ROWS, data.num_rows):,} rows)')
+    st.write(data.slice(0, RAW_DATA_ROWS).to_pandas())
 
 st.subheader('Number of pickups by hour')
-hist_values = np.histogram(data[DATE_COLUMN].dt.hour, bins=24, range=(0,24))[0]
+# Rows are sorted by hour, so the histogram is the distance between hour offsets
+hist_values = np.diff(hour_offsets)
 st.bar_chart(hist_values)
 
 # Some number in the range 0-23
 hour_to_filter = st.slider('hour', 0, 23, 17)
-filtered_data = data[data[DATE_COLUMN].dt.hour == hour_to_filter]
+filtered_data = load_hour(hour_to_filter)
 
 st.subheader('Map of all pickups at %s:00' % hour_to_filter)
-st.map(filtered_data)
\ No newline at end of file
+st.map(filtered_data)
@@ -0,0 +1,68 @@
+'''
+  Builds and opens a local Arrow snapshot of the Uber pickups data.
+
+  The snapshot is written once (at image build time, or on the first start of a container that
+  doesn't have it) with rows sorted by pickup hour, an `hour` column, and the row offset where
+  each hour starts. Opening it memory-maps the file, so the app reads only the pages it touches
+  and a full month of pickups doesn't have to fit in the container's memory.
+
+  To build the snapshot into the image, run:
+    python snapshot.py
+'''
+
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+DATE_COLUMN = 'date/time'
+DATA_URL = ('https://s3-us-west-2.amazonaws.com/'
+            'streamlit-demo-data/uber-raw-data-sep14.csv.gz')
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', 'data/uber-raw-data-sep14.arrow')
+
+
+def build_snapshot(path=SNAPSHOT_PATH, source_url=DATA_URL, nrows=None, chunksize=250_000):
+    '''Download the CSV in chunks and write it as an Arrow file sorted by hour. nrows=None loads the full month.'''
+    chunks = []
+    for chunk in pd.read_csv(source_url, nrows=nrows, chunksize=chunksize):
+        chunk.rename(lambda x: str(x).lower(), axis='columns', inplace=True)
+        chunk[DATE_COLUMN] = pd.to_datetime(chunk[DATE_COLUMN], format='%m/%d/%Y %H:%M:%S')
+        chunk['hour'] = chunk[DATE_COLUMN].dt.hour.astype('int8')
+        chunks.append(pa.Table.from_pandas(chunk, preserve_index=False))
+    table = pa.concat_tables(chunks)
+
+    # Sort by hour (stable, so pickups keep their original order within an hour) and record
+    # where each hour starts: rows of hour h are offsets[h]:offsets[h + 1]
+    table = table.take(pc.sort_indices(table, sort_keys=[('hour', 'ascending')]))
+    counts = np.bincount(table['hour'].to_numpy(), minlength=24)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    table = table.replace_schema_metadata({'hour_offsets': json.dumps(offsets)})
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Uncompressed, so the file can be memory-mapped instead of decoded; written next to the
+    # target and renamed, so a concurrently starting app never opens a half-written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=chunksize)
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_snapshot(path=SNAPSHOT_PATH):
+    '''Memory-map a snapshot, building it first if it doesn't exist. Returns (table, hour offsets).'''
+    if not os.path.exists(path):
+        build_snapshot(path)
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    offsets = json.loads(table.schema.metadata[b'hour_offsets'])
+    return table, offsets
+
+
+if __name__ == '__main__':
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f'Wrote {build_snapshot(nrows=nrows)}')